@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import functools
+import threading
+import contextlib
+try:
+    import fcntl
+except ImportError:
+    # no file locks on Windows, processes may then compute the same entry twice
+    fcntl = None
+
+# Disk cache shared by every streamlit process on the host (several instances run behind nginx).
+# Results are pickled to data/cache/<key>.pkl, where key hashes the function, its source and the
+# arguments without a leading underscore, like st.cache_data, plus CACHE_VERSION and the source of
+# the helper modules the cached functions call (HELPER_MODULES), so a release that changes them
+# computes new entries instead of reading ones made by the old code. Pass a dataset version or token
+# with any frame given as an underscore argument. Files are written to a temp name and renamed,
+# so a process never reads a half written entry, and the least recently used entries are removed
+# once the directory grows past DISK_CACHE_BYTES. A process computing an entry holds the lock file of
+# its key, the others wait for it and read the result instead of computing it again. Every key has
+# its own lock, so a cached function calling another one (nested entries) never waits for itself.
+
+DISK_CACHE_DIR = "data/cache"
+DISK_CACHE_BYTES = 512 * 1024 * 1024
+# bump when cached results change in a way the sources below do not show (e.g. a library upgrade)
+CACHE_VERSION = 1
+HELPER_MODULES = ["IndexHelper", "ForecastHelper", "RegressionHelper", "ChartHelper", "DatasetHelper",
+                  "NormalizeHelper", "PageDataHelper"]
+
+def _key_part(value):
+    # arrays, Index and Series are keyed by their values
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return value
+
+def function_code(func):
+    # source of the function, so entries change with the code; bytecode when there is no source
+    try:
+        return inspect.getsource(func)
+    except OSError:
+        return func.__code__.co_code.hex()
+
+@functools.lru_cache(maxsize=64)
+def _file_code(path:str, mtime:float):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def file_code(path:str):
+    # hash of a source file, e.g. the page whose module level code prepared a cached argument.
+    # Read again when the file changes, the path itself when there is no file
+    try:
+        return _file_code(path, os.path.getmtime(path))
+    except OSError:
+        return path
+
+@functools.lru_cache(maxsize=None)
+def helper_version():
+    # CACHE_VERSION and a hash of the helper module sources, read once per process
+    hashed = hashlib.sha256(str(CACHE_VERSION).encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in HELPER_MODULES:
+        path = os.path.join(directory, name + ".py")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                hashed.update(f.read())
+    return hashed.hexdigest()[:16]
+
+def cache_key(func, code:str, arguments:dict):
+    hashed = hashlib.sha256(f"{helper_version()}\n{func.__module__}.{func.__qualname__}\n{code}".encode())
+    arguments = {name: _key_part(value) for name, value in arguments.items() if not name.startswith("_")}
+    hashed.update(json.dumps(arguments, sort_keys=True, default=str).encode())
+    return hashed.hexdigest()[:32]
+
+def evict(limit:int=DISK_CACHE_BYTES, directory:str=DISK_CACHE_DIR):
+    # remove the least recently used entries until the directory fits in limit bytes
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".pkl"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        for remove in [path, path[:-len(".pkl")] + ".lock"]:
+            try:
+                os.remove(remove)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+# Concurrent calls with the same key, e.g. every session opening a page right after a restart,
+# wait for the first one and share its result (single flight).
+_flights = {}
+_flights_lock = threading.Lock()
+
+def single_flight(key:str, compute):
+    # (result, leader), leader is False when the result was computed by another thread
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = {"done": threading.Event()}
+    if not leader:
+        flight["done"].wait()
+        if "error" in flight:
+            raise flight["error"]
+        return flight["result"], False
+    try:
+        flight["result"] = compute()
+    except BaseException as error:
+        flight["error"] = error
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight["done"].set()
+    return flight["result"], True
+
+@contextlib.contextmanager
+def file_lock(key:str):
+    # exclusive lock across processes, one lock file per key (removed by evict with its entry).
+    # flock does not nest: a thread locking the same file again through a new open() waits forever
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(DISK_CACHE_DIR, key + ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _read_entry(path:str):
+    # (found, value)
+    try:
+        with open(path, "rb") as f:
+            result = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return False, None
+    # mtime is the last use, evict removes the oldest. Another process may have evicted the entry
+    # since it was read, the value is still good
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return True, result
+
+def disk_cache(func):
+    code = function_code(func)
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = cache_key(func, code, bound.arguments)
+        path = os.path.join(DISK_CACHE_DIR, key + ".pkl")
+        found, result = _read_entry(path)
+        if found:
+            return result
+        with file_lock(key):
+            # another process may have written it while this one waited for the lock
+            found, result = _read_entry(path)
+            if found:
+                return result
+            result = func(*args, **kwargs)
+            os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        evict()
+        return result
+    return wrapper
+
+# In-process cache of the helpers, bounded by bytes instead of entry count. Results are kept
+# pickled, so the size of every entry is known exactly and every caller gets its own copy like
+# with st.cache_data. Past the budget the least recently ("lru") or least frequently ("lfu")
+# used entries are dropped.
+
+MEMORY_CACHE_BYTES = 256 * 1024 * 1024
+MEMORY_CACHE_TTL = 60*60*24*7
+
+class ByteCache:
+
+    def __init__(self, budget:int=MEMORY_CACHE_BYTES, ttl:float=MEMORY_CACHE_TTL, policy:str="lru"):
+        self.budget = budget
+        self.ttl = ttl
+        self.policy = policy
+        # key -> [data, size, hits, last_used, expires]
+        self._entries = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key:str):
+        # (found, value)
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and entry[4] < now:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._hits += 1
+            entry[2] += 1
+            entry[3] = now
+            data = entry[0]
+        return True, pickle.loads(data)
+
+    def set(self, key:str, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        size = len(data)
+        if size > self.budget:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            now = time.monotonic()
+            self._entries[key] = [data, size, 0, now, now + self.ttl]
+            self._bytes += size
+            while self._bytes > self.budget:
+                self._remove(min(self._entries, key=self._rank))
+                self._evictions += 1
+
+    def _rank(self, key:str):
+        _, _, hits, last_used, _ = self._entries[key]
+        return (hits, last_used) if self.policy == "lfu" else last_used
+
+    def _remove(self, key:str):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "budget": self.budget,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+MEMORY_CACHE = ByteCache()
+
+def _compute(key:str, func, args, kwargs):
+    # the entry may have been stored between the cache miss and taking the flight
+    found, result = MEMORY_CACHE.get(key)
+    if not found:
+        result = func(*args, **kwargs)
+        MEMORY_CACHE.set(key, result)
+    return result
+
+def memory_cache(func):
+    code = function_code(func)
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = cache_key(func, code, bound.arguments)
+        found, result = MEMORY_CACHE.get(key)
+        if found:
+            return result
+        result, leader = single_flight(key, lambda: _compute(key, func, args, kwargs))
+        if not leader:
+            # every caller gets its own copy, same as a cache hit
+            found, copy = MEMORY_CACHE.get(key)
+            return copy if found else pickle.loads(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        return result
+    return wrapper
@@ -0,0 +1,184 @@
+import copy
+import base64
+import json
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Data preparation for the plotly charts of the pages. Like IndexHelper, nothing in here depends
+# on streamlit.
+
+# most points an animated scatter sends over all of its frames
+SCATTER_POINT_BUDGET = 5000
+
+def bin_scatter_frames(df, x:str, y:str, color:str, frame:str="date", keep:list=(), max_points:int=SCATTER_POINT_BUDGET, other:str="Other"):
+    # Rows for px.scatter(animation_frame=frame) with at most max_points points over all frames.
+    # Every frame gets an equal share of the budget. Frames within their share keep their rows,
+    # larger frames get one point per color and (x, y) cell at the mean position of the rows in
+    # it. Cells are quantiles of all rows, so dense price ranges get more of them, and the same
+    # for every frame, so the animation keeps its shape. "count" is the number of rows behind a
+    # point. keep are other columns for hover texts, taken from the first row of a cell. With more
+    # colors than points per frame the rarest ones are shown as one color, other, in the binned
+    # frames. Every frame keeps at least one point, so more frames than max_points exceed it.
+    columns = list(dict.fromkeys([frame, color, x, y] + list(keep)))
+    df = df[columns].dropna(subset=[x, y])
+    n_frames = df[frame].nunique()
+    if len(df) <= max_points or n_frames == 0:
+        return df.assign(count=1)
+
+    frame_budget = max(1, max_points // n_frames)
+    n_colors = max(1, df[color].nunique())
+    frame_sizes = df.groupby(frame, observed=True)[x].transform("size")
+    small = frame_sizes <= frame_budget
+
+    large = df[~small]
+    if n_colors > frame_budget:
+        common = df[color].value_counts().index[:frame_budget - 1]
+        large = large.assign(**{color: large[color].astype(object).where(large[color].isin(common), other)})
+        n_colors = frame_budget
+    n_cells = max(1, int(np.sqrt(frame_budget / n_colors)))
+    large = large.assign(
+        x_cell=pd.qcut(df[x], n_cells, labels=False, duplicates="drop")[~small],
+        y_cell=pd.qcut(df[y], n_cells, labels=False, duplicates="drop")[~small],
+    )
+    aggregations = {column: (column, "first") for column in columns if column not in (frame, color, x, y)}
+    aggregations.update({x: (x, "mean"), y: (y, "mean"), "count": (x, "size")})
+    binned = large.groupby([frame, color, "x_cell", "y_cell"], observed=True, sort=False).agg(**aggregations)
+    binned = binned.reset_index().drop(columns=["x_cell", "y_cell"])
+    frames = pd.concat([df[small].assign(count=1), binned[columns + ["count"]]], ignore_index=True)
+    # px orders the animation frames by first appearance
+    return frames.sort_values(by=frame, kind="stable", ignore_index=True)
+
+# Figures are sent to the browser as JSON on every rerun. compact_figure rounds numeric arrays
+# to what the hover labels show, stores whole numbers in the smallest integer type (plotly >= 6
+# sends numpy arrays as base64 typed arrays, where that halves or quarters them) and drops
+# customdata no template refers to. Pages only compact cached figures (cached_figure,
+# get_frame_figure), not on every rerun. Sizes before and after cost two more JSON encodings, so
+# they are only kept in FIGURE_BYTES by name after measure_figures(), as build.py prewarm does.
+FIGURE_DECIMALS = 2
+# shorter arrays are left as they are
+COMPACT_ARRAY_LENGTH = 16
+# treemap/sunburst areas, children have to add up to their parent so they are never rounded
+EXACT_KEYS = ["values"]
+FIGURE_BYTES = {}
+_measure_figures = False
+
+def _compact_array(values, decimals:int):
+    if decimals is not None and values.dtype.kind == "f":
+        values = np.round(values, decimals)
+    if values.dtype.kind in "fiu" and np.isfinite(values).all() and (values == np.round(values)).all():
+        for dtype in ["int8", "uint8", "int16", "uint16", "int32", "uint32"]:
+            info = np.iinfo(dtype)
+            if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+                values = values.astype(dtype)
+                break
+    # rounded numbers can be shorter as text than as base64 bytes
+    text = values.tolist()
+    if len(json.dumps(text)) < values.nbytes * 4 / 3:
+        return text
+    return values
+
+def _typed_array(spec:dict):
+    # {"dtype", "bdata", "shape"} of plotly >= 6 back to a numpy array
+    values = np.frombuffer(base64.b64decode(spec["bdata"]), dtype=spec["dtype"])
+    if "shape" in spec:
+        values = values.reshape([int(size) for size in str(spec["shape"]).split(",")])
+    return values
+
+def _compact_trace(trace:dict, decimals:int, min_length:int):
+    templates = str(trace.get("hovertemplate", "")) + str(trace.get("texttemplate", ""))
+    if "customdata" in trace and "customdata" not in templates:
+        del trace["customdata"]
+    for key, value in trace.items():
+        if isinstance(value, dict) and "bdata" in value:
+            value = _typed_array(value)
+        if isinstance(value, dict):
+            _compact_trace(value, decimals, min_length)
+        elif isinstance(value, (list, tuple, np.ndarray)) and len(value) >= min_length:
+            array = np.asarray(value)
+            if array.dtype.kind in "fiu":
+                trace[key] = _compact_array(array, None if key in EXACT_KEYS else decimals)
+
+def figure_bytes(fig):
+    return len(pio.to_json(fig, validate=False))
+
+def compact_figure(fig, name:str=None, decimals:int=FIGURE_DECIMALS, min_length:int=COMPACT_ARRAY_LENGTH):
+    # compacted copy of fig (a figure or a figure dict), fig itself is not changed
+    compact = fig.to_dict() if hasattr(fig, "to_dict") else copy.deepcopy(fig)
+    for trace in compact.get("data", []) + [trace for frame in compact.get("frames", []) for trace in frame.get("data", [])]:
+        _compact_trace(trace, decimals, min_length)
+    compact = go.Figure(compact)
+    if name is not None and _measure_figures:
+        FIGURE_BYTES[name] = (figure_bytes(fig), figure_bytes(compact))
+    return compact
+
+def measure_figures(enabled:bool=True):
+    # record the sizes of the figures compacted from now on in this process
+    global _measure_figures
+    _measure_figures = enabled
+
+def figure_report():
+    # name -> (bytes before, bytes after) of the figures compacted in this process
+    return dict(FIGURE_BYTES)
+
+# Treemap hierarchies. Rows are placed by levels, e.g. category_parent / category / technique /
+# author, except rows matched by a rule (column, values, path): those use path instead, so a
+# level can be skipped (Watercolor directly under Painting) and the author moved up. Levels
+# past the end of a row's path are empty and the row ends there.
+
+def collapse_levels(df, levels:list, rules:list):
+    # df with the levels rearranged by the first rule each row matches, rules are checked against
+    # the original columns
+    original = {level: df[level].to_numpy(dtype=object) for level in levels}
+    collapsed = {level: values.copy() for level, values in original.items()}
+    matched = np.zeros(len(df), dtype=bool)
+    for column, values, path in rules:
+        rows = ~matched & df[column].isin(values).to_numpy()
+        matched |= rows
+        for i, level in enumerate(levels):
+            collapsed[level][rows] = original[path[i]][rows] if i < len(path) else None
+    return df.assign(**collapsed)
+
+def treemap_nodes(df, levels:list, values:str, color:str=None, root:str=None):
+    # One row per node (id, label, parent, values, color) of px.treemap(df, path=[px.Constant(root)]
+    # + levels, values=values, color=color): values are summed and the color is averaged
+    # weighted by values, the same way px does it. Rows end at their first empty level.
+    n_rows = len(df)
+    weights = df[values].to_numpy(dtype=float)
+    weighted = df[color].to_numpy(dtype=float) * weights if color is not None else None
+    paths = np.full(n_rows, root, dtype=object) if root is not None else None
+    valid = np.ones(n_rows, dtype=bool)
+    depths = [(paths, np.full(n_rows, None, dtype=object), paths)] if root is not None else []
+    for level in levels:
+        labels = df[level].to_numpy(dtype=object)
+        valid = valid & pd.notna(labels)
+        labels = labels.astype(str)
+        parents = paths
+        paths = labels if paths is None else paths + "/" + labels
+        depths.append((np.where(valid, paths, None), parents, labels))
+
+    frames = []
+    for ids, parents, labels in depths:
+        rows = pd.notna(ids)
+        frames.append(pd.DataFrame({
+            "id": ids[rows],
+            "label": labels[rows],
+            "parent": parents[rows] if parents is not None else "",
+            values: weights[rows],
+            "weighted": weighted[rows] if weighted is not None else np.nan,
+        }))
+    nodes = pd.concat(frames, ignore_index=True)
+    nodes["parent"] = nodes["parent"].fillna("")
+    nodes = nodes.groupby(["id", "label", "parent"], sort=False).sum(min_count=1).reset_index()
+    if color is not None:
+        nodes[color] = nodes.pop("weighted").fillna(0) / nodes[values]
+    else:
+        nodes = nodes.drop(columns=["weighted"])
+    return nodes
+
+def treemap_figure(nodes, values:str, color:str=None, **kwargs):
+    # px.treemap of treemap_nodes, kwargs as for px.treemap (color_continuous_scale, labels, ...)
+    return px.treemap(nodes, ids="id", names="label", parents="parent", values=values, color=color,
+                      branchvalues="total", **kwargs)
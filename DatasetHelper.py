@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Columnar copies of the CSV datasets. `python build.py datasets` writes data/build/<name>.parquet
+# with compact dtypes (categorical text, int16 years, float32 prices). read_dataset loads the
+# Parquet file when it is up to date and otherwise parses the CSV into the same dtypes, so pages
+# see the same frame either way.
+
+BUILD_DIR = "data/build"
+DATASETS = ["data/auctions_clean.csv", "data/haus_cleaned.csv", "data/historical_avg_price.csv"]
+CATEGORY_COLUMNS = ["author", "technique", "category", "tech", "src"]
+FLOAT_COLUMNS = ["start_price", "end_price", "year", "decade", "dimension", "volume", "avg_price"]
+
+def optimize_dtypes(df):
+    df = df.copy()
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in FLOAT_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("float32")
+    if "date" in df.columns:
+        df["date"] = df["date"].astype("int16" if df["date"].notna().all() else "float32")
+    return df
+
+def file_version(path:str):
+    # changes whenever the file is rewritten, cheap to compute compared to hashing the data
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def content_token(df):
+    # content hash of a frame, computed once when it is loaded. Cached functions take the token
+    # and skip hashing the frame itself (leading underscore), so lookups cost the same at any size
+    hashed = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    hashed.update(json.dumps([[str(column) for column in df.columns], [str(dtype) for dtype in df.dtypes]]).encode())
+    return hashed.hexdigest()[:16]
+
+def built_path(path:str):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(BUILD_DIR, name + ".parquet")
+
+def build_dataset(path:str):
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    built = built_path(path)
+    optimize_dtypes(pd.read_csv(path)).to_parquet(built + ".tmp", index=False)
+    os.replace(built + ".tmp", built)
+    return built
+
+def read_dataset(path:str):
+    built = built_path(path)
+    if os.path.exists(built) and os.path.getmtime(built) >= os.path.getmtime(path):
+        return pd.read_parquet(built)
+    return optimize_dtypes(pd.read_csv(path))
+
+def replace_values(series, mapping:dict):
+    # Series.replace that renames the categories of a categorical column instead of the rows,
+    # values can be merged into existing categories or become new ones
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.replace(mapping)
+    renamed = series.cat.categories.map(lambda value: mapping.get(value, value))
+    renamed_codes, categories = pd.factorize(renamed, sort=True)
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, renamed_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=series.index, name=series.name)
@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import plotly.graph_objects as go
+from concurrent.futures import ProcessPoolExecutor
+from IndexHelper import yearly_prices
+from ImportHelper import lazy_import
+
+# Forecast artifact store. Prophet models are fitted by `python build.py forecasts` and saved
+# under data/forecasts/<key>, where key is a hash of the input series and the forecast settings.
+# The pages only read the saved forecast and figure, so they never import prophet.
+
+FORECAST_DIR = "data/forecasts"
+# name -> artifact key of the forecasts built in batch (category/<name>, author/<name>)
+FORECAST_INDEX = os.path.join(FORECAST_DIR, "index.json")
+
+def forecast_series(df):
+    # Prophet input from a frame with date and avg_price columns (data/historical_avg_price.csv)
+    return df[["date", "avg_price"]].rename(columns={"date": "ds", "avg_price": "y"}).reset_index(drop=True)
+
+def forecast_key(series, periods:int, tail:int):
+    hashed = hashlib.sha256(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    hashed.update(json.dumps({"periods": periods, "tail": tail}).encode())
+    return hashed.hexdigest()[:16]
+
+def group_series(df, column:str, values:list=None, min_years:int=3):
+    # forecast inputs per category / author (rows or cube): yearly average end price
+    prices = yearly_prices(df, column, calculate_volume=False).dropna()
+    series = {}
+    for value, prices_by_date in prices.groupby(level=0, sort=False):
+        if values is not None and value not in values or len(prices_by_date) < min_years:
+            continue
+        dates = prices_by_date.index.get_level_values(1)
+        series[f"{column}/{value}"] = forecast_series(pd.DataFrame({"date": dates, "avg_price": prices_by_date.to_numpy()}))
+    return series
+
+def fit_forecast(series, periods:int=20428, tail:int=1770, backend:str=None):
+    # backend is a prophet StanBackendEnum name, None tries them in order
+    Prophet = lazy_import("prophet").Prophet
+    model = Prophet(stan_backend=backend)
+    model.fit(series)
+    future = model.make_future_dataframe(periods=periods)
+    forecast = model.predict(future.tail(tail))
+    return model, forecast
+
+def build_forecast(series, periods:int=20428, tail:int=1770, name:str="", backend:str=None):
+    # fit and write model, forecast frame and the plot_plotly figure, returns the artifact key
+    plot_plotly = lazy_import("prophet.plot").plot_plotly
+    model_to_json = lazy_import("prophet.serialize").model_to_json
+    key = forecast_key(series, periods, tail)
+    model, forecast = fit_forecast(series, periods, tail, backend)
+    path = os.path.join(FORECAST_DIR, key)
+    os.makedirs(path, exist_ok=True)
+    files = {
+        "model.json": model_to_json(model),
+        "forecast.csv": forecast.to_csv(index=False),
+        "meta.json": json.dumps({"name": name, "periods": periods, "tail": tail, "rows": len(series)}),
+        # written last, load_forecast treats the artifact as complete once it exists
+        "figure.json": plot_plotly(model, forecast).to_json(),
+    }
+    for file_name, content in files.items():
+        # pages fit missing artifacts themselves, several processes may write the same one at once
+        temp_path = os.path.join(path, f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, os.path.join(path, file_name))
+    return key
+
+def load_artifact(key:str):
+    # saved (forecast, figure), None when it has not been built yet
+    path = os.path.join(FORECAST_DIR, key)
+    if not os.path.exists(os.path.join(path, "figure.json")):
+        return None
+    forecast = pd.read_csv(os.path.join(path, "forecast.csv"), parse_dates=["ds"])
+    with open(os.path.join(path, "figure.json")) as f:
+        figure = pio.from_json(f.read())
+    return forecast, figure
+
+def load_forecast(series, periods:int=20428, tail:int=1770):
+    return load_artifact(forecast_key(series, periods, tail))
+
+# Quick forecasters: yearly series in, frame with ds (year), yhat, yhat_lower and yhat_upper out,
+# history included like Prophet's predict. "ets" and "arima" fit in milliseconds with statsmodels.
+
+def _yearly(series):
+    # one value per year, sources reporting the same year are averaged
+    return series.groupby(series["ds"].astype(int))["y"].mean()
+
+def _forecast_frame(years, horizon:int, mean, lower, upper):
+    return pd.DataFrame({
+        "ds": np.r_[years, np.arange(years[-1]+1, years[-1]+horizon+1)],
+        "yhat": np.asarray(mean),
+        "yhat_lower": np.asarray(lower),
+        "yhat_upper": np.asarray(upper),
+    })
+
+def ets_forecast(series, horizon:int=5, interval:float=0.8):
+    ETSModel = lazy_import("statsmodels.tsa.exponential_smoothing.ets").ETSModel
+    y = _yearly(series)
+    fit = ETSModel(y.reset_index(drop=True).astype(float), error="add", trend="add", damped_trend=True).fit(disp=False)
+    frame = fit.get_prediction(start=0, end=len(y)+horizon-1).summary_frame(alpha=1-interval)
+    return _forecast_frame(y.index.to_numpy(), horizon, frame["mean"], frame["pi_lower"], frame["pi_upper"])
+
+def arima_forecast(series, horizon:int=5, interval:float=0.8):
+    ARIMA = lazy_import("statsmodels.tsa.arima.model").ARIMA
+    y = _yearly(series)
+    fit = ARIMA(y.reset_index(drop=True).astype(float), order=(1, 1, 0), trend="t").fit()
+    frame = fit.get_prediction(start=1, end=len(y)+horizon-1).summary_frame(alpha=1-interval)
+    # the first year has no previous value to difference against, keep the observation
+    first = y.iloc[0]
+    return _forecast_frame(y.index.to_numpy(), horizon, np.r_[first, frame["mean"]],
+                           np.r_[first, frame["mean_ci_lower"]], np.r_[first, frame["mean_ci_upper"]])
+
+def prophet_forecast(series, horizon:int=5, interval:float=0.8):
+    Prophet = lazy_import("prophet").Prophet
+    y = _yearly(series)
+    history = pd.DataFrame({"ds": pd.to_datetime(y.index.astype(str)), "y": y.to_numpy()})
+    model = Prophet(interval_width=interval, yearly_seasonality=False, weekly_seasonality=False, daily_seasonality=False)
+    model.fit(history)
+    forecast = model.predict(model.make_future_dataframe(periods=horizon, freq="YS"))
+    return _forecast_frame(y.index.to_numpy(), horizon, forecast["yhat"], forecast["yhat_lower"], forecast["yhat_upper"])
+
+FORECASTERS = {"ets": ets_forecast, "arima": arima_forecast, "prophet": prophet_forecast}
+
+def quick_forecast(series, backend:str="ets", horizon:int=5):
+    return FORECASTERS[backend](series, horizon)
+
+def forecast_figure(series, forecast):
+    # same look as prophet's plot_plotly: observations, prediction and uncertainty band
+    y = _yearly(series)
+    return go.Figure([
+        go.Scatter(name="Actual", x=y.index, y=y, mode="markers", marker=dict(color="black", size=4)),
+        go.Scatter(x=forecast["ds"], y=forecast["yhat_lower"], mode="lines", line=dict(width=0), hoverinfo="skip", showlegend=False),
+        go.Scatter(name="Predicted", x=forecast["ds"], y=forecast["yhat"], mode="lines", line=dict(color="#0072B2", width=2),
+                   fill="tonexty", fillcolor="rgba(0, 114, 178, 0.2)"),
+        go.Scatter(x=forecast["ds"], y=forecast["yhat_upper"], mode="lines", line=dict(width=0), hoverinfo="skip", showlegend=False,
+                   fill="tonexty", fillcolor="rgba(0, 114, 178, 0.2)"),
+    ])
+
+# Stan backend of the worker processes, named so Prophet(stan_backend=...) skips probing the others
+WORKER_BACKEND = "CMDSTANPY"
+
+def _start_worker():
+    # load prophet and the compiled Stan model once per worker process, later fits reuse them
+    lazy_import("prophet").Prophet(stan_backend=WORKER_BACKEND)
+
+def _build_in_worker(series, periods:int, tail:int, name:str):
+    return build_forecast(series, periods, tail, name, backend=WORKER_BACKEND)
+
+def build_forecasts(series_by_name:dict, periods:int=20428, tail:int=1770, workers:int=None):
+    # fit every series on a process pool and record name -> key in the forecast index
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker) as pool:
+        futures = {name: pool.submit(_build_in_worker, series, periods, tail, name) for name, series in series_by_name.items()}
+        keys = {name: future.result() for name, future in futures.items()}
+    index = read_forecast_index()
+    index.update(keys)
+    os.makedirs(FORECAST_DIR, exist_ok=True)
+    temp_path = f"{FORECAST_INDEX}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(index, f, indent=1, ensure_ascii=False)
+    os.replace(temp_path, FORECAST_INDEX)
+    return keys
+
+def read_forecast_index():
+    if not os.path.exists(FORECAST_INDEX):
+        return {}
+    with open(FORECAST_INDEX) as f:
+        return json.load(f)
+
+def load_named_forecast(name:str):
+    # (forecast, figure) built by build_forecasts, e.g. "category/Graphics"; None when missing
+    key = read_forecast_index().get(name)
+    if key is None:
+        return None
+    return load_artifact(key)
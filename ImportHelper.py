@@ -0,0 +1,44 @@
+import sys
+import time
+import importlib
+import threading
+
+# Heavy analytics dependencies (statsmodels, scipy, prophet) are imported where they are used
+# through lazy_import instead of at module top, so a page only pays for what it renders.
+# preload imports them on a background thread when the server starts, and IMPORT_TIMES keeps
+# how long every lazily imported module took.
+
+PRELOAD_MODULES = ["statsmodels.tsa.exponential_smoothing.ets", "scipy.sparse.linalg"]
+# module -> seconds, only for modules that were not loaded yet
+IMPORT_TIMES = {}
+_preload_thread = None
+
+def lazy_import(name:str):
+    # import_module returns loaded modules right away and waits for one that another thread
+    # (preload) is still importing
+    loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not loaded:
+        IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+def _preload(names:list):
+    for name in names:
+        try:
+            lazy_import(name)
+        except ImportError:
+            # optional dependency, the code using it reports the error when it is needed
+            pass
+
+def preload(names:list=PRELOAD_MODULES):
+    # starts the background import once per process, returns the thread
+    global _preload_thread
+    if _preload_thread is None:
+        _preload_thread = threading.Thread(target=_preload, args=(list(names),), name="preload", daemon=True)
+        _preload_thread.start()
+    return _preload_thread
+
+def import_report():
+    # slowest first
+    return dict(sorted(IMPORT_TIMES.items(), key=lambda item: -item[1]))
@@ -0,0 +1,185 @@
+import pandas as pd
+import numpy as np
+
+# Index computations shared by the pages. Nothing in here depends on streamlit,
+# so the same functions can be used from build scripts.
+
+CUBE_KEYS = ["category_parent", "category", "technique", "author", "date"]
+CUBE_MEASURES = ["end_price", "start_price"]
+
+def create_cube(df):
+    # Aggregate the auction rows once per (category_parent, category, technique, author, date).
+    # Tables, treemaps and area charts re-aggregate this instead of rescanning the rows.
+    keys = [key for key in CUBE_KEYS if key in df.columns]
+    # prices may be stored as float32, aggregate in float64 so sums match the CSV data
+    rows = df[keys + CUBE_MEASURES].astype({measure: "float64" for measure in CUBE_MEASURES})
+    start_price = rows["start_price"].fillna(rows["end_price"])
+    rows["overbid_%"] = (rows["end_price"] - start_price) / start_price * 100
+    aggregations = {}
+    for measure in CUBE_MEASURES:
+        for func in ["count", "sum", "mean", "median"]:
+            aggregations[f"{measure}_{func}"] = (measure, func)
+    aggregations["overbid_%_count"] = ("overbid_%", "count")
+    aggregations["overbid_%_sum"] = ("overbid_%", "sum")
+    cube = rows.groupby(keys, sort=True, dropna=False, observed=True).agg(**aggregations)
+    return cube.reset_index()
+
+def is_cube(df):
+    return "end_price_count" in df.columns
+
+def cube_totals(cube, keys:list):
+    # total sales and mean overbid per group, same as grouping the rows with
+    # .agg({'end_price':['sum'], 'overbid_%':['mean']})
+    grouped = cube.groupby(keys, observed=True)
+    totals = pd.DataFrame({
+        "total_sales": grouped["end_price_sum"].sum(),
+        "overbid_%": grouped["overbid_%_sum"].sum() / grouped["overbid_%_count"].sum(),
+    })
+    # plain columns, the treemap code moves values between them
+    totals = totals.reset_index()
+    return totals.astype({key: object for key in keys if isinstance(totals[key].dtype, pd.CategoricalDtype)})
+
+def cube_history(cube):
+    # average price and volume for every auction year between the first and the last one
+    grouped = cube.groupby("date")
+    volumes = grouped["end_price_sum"].sum()
+    prices = volumes / grouped["end_price_count"].sum()
+    dates = range(int(volumes.index.min()), int(volumes.index.max())+1)
+    return pd.DataFrame({
+        "avg_price": prices.reindex(dates).to_numpy(),
+        "volume": volumes.reindex(dates, fill_value=0).to_numpy(),
+        "date": list(dates),
+    })
+
+def yearly_prices(df, category_column:str, calculate_volume:bool):
+    # Total (volume) or average end price per category and year, from the rows or from a cube
+    if is_cube(df):
+        grouped = df.groupby([category_column, "date"], sort=True, observed=True)
+        volumes = grouped["end_price_sum"].sum()
+        if calculate_volume:
+            return volumes
+        return volumes / grouped["end_price_count"].sum()
+    grouped = df.groupby([category_column, "date"], sort=True, observed=True)["end_price"]
+    if calculate_volume:
+        return grouped.sum()
+    return grouped.mean()
+
+CHAIN_STATE_COLUMNS = ["start_year", "last_date", "dates", "first_price", "last_price", "last_year", "change_sum", "change_count"]
+
+def chain_state(prices, state=None):
+    # Running state of the growth chain of every category in prices: Series indexed by
+    # (category, date), sorted by date inside each category. A year is skipped when its price
+    # (or the chain's starting price) is zero and growth is divided by the gap to the last
+    # year that was not skipped, same as the old per-category loop.
+    # When state is given, prices are new years appended to it and only the chains they
+    # touch are updated; years that are not newer than a chain's last year are rejected.
+    if state is None:
+        state = pd.DataFrame(columns=CHAIN_STATE_COLUMNS)
+    if len(prices) == 0:
+        return state
+    cats = prices.index.get_level_values(0)
+    dates = prices.index.get_level_values(1).to_numpy()
+    values = prices.to_numpy(dtype=float)
+
+    codes, uniques = pd.factorize(cats)
+    starts = np.r_[True, codes[1:] != codes[:-1]]
+    group_id = np.cumsum(starts) - 1
+    n_groups = len(uniques)
+
+    has_prior = uniques.isin(state.index)
+    prior = state.reindex(uniques)
+    if (dates[starts][has_prior] <= prior["last_date"].to_numpy(dtype=float)[has_prior]).any():
+        raise ValueError("Appended prices must be newer than the last year of every chain they touch, rebuild the state instead")
+
+    chain_start = starts & ~has_prior[group_id]
+    first_price = np.where(has_prior, prior["first_price"].to_numpy(dtype=float), values[starts])
+    # a chain that starts at zero never moves, otherwise every non-zero year is kept
+    kept = chain_start | ((values != 0) & (first_price[group_id] != 0))
+    kept_values = values[kept]
+    kept_dates = dates[kept]
+    kept_group = group_id[kept]
+    kept_change = ~chain_start[kept]
+
+    # every kept year grows from the previous kept year, the first one of an existing chain from its state.
+    # A batch can keep no year at all (only zero prices, or chains that started at zero)
+    n_kept = len(kept_group)
+    first_kept = np.r_[True, kept_group[1:] != kept_group[:-1]][:n_kept]
+    prev_values = np.r_[np.nan, kept_values[:-1]][:n_kept]
+    prev_values[first_kept] = prior["last_price"].to_numpy(dtype=float)[kept_group[first_kept]]
+    prev_dates = np.r_[np.nan, kept_dates[:-1]][:n_kept]
+    prev_dates[first_kept] = prior["last_year"].to_numpy(dtype=float)[kept_group[first_kept]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = (kept_values - prev_values) / prev_values * 100 / (kept_dates - prev_dates)
+    # NaN in any change makes the mean NaN, same as np.mean
+    change_sum = np.bincount(kept_group[kept_change], weights=changes[kept_change], minlength=n_groups)
+    change_count = np.bincount(kept_group[kept_change], minlength=n_groups)
+
+    group_end = np.r_[starts[1:], True]
+    last_kept = np.r_[first_kept[1:], True][:n_kept]
+    last_price = np.where(has_prior, prior["last_price"].to_numpy(dtype=float), np.nan)
+    last_year = np.where(has_prior, prior["last_year"].to_numpy(dtype=float), np.nan)
+    last_price[kept_group[last_kept]] = kept_values[last_kept]
+    last_year[kept_group[last_kept]] = kept_dates[last_kept]
+
+    updated = pd.DataFrame({
+        "start_year": np.where(has_prior, prior["start_year"].to_numpy(dtype=float), dates[starts]),
+        "last_date": dates[group_end],
+        "dates": np.bincount(group_id, minlength=n_groups) + np.where(has_prior, prior["dates"].to_numpy(dtype=float), 0).astype(int),
+        "first_price": first_price,
+        "last_price": last_price,
+        "last_year": last_year,
+        # only new chains start from 0, a NaN change of an existing chain stays NaN like in np.mean
+        "change_sum": change_sum + np.where(has_prior, prior["change_sum"].to_numpy(dtype=float), 0),
+        "change_count": change_count + np.where(has_prior, prior["change_count"].to_numpy(dtype=float), 0).astype(int),
+    }, index=uniques)
+    if len(state) == 0:
+        return updated
+    return pd.concat([state[~state.index.isin(uniques)], updated])
+
+def chain_metrics(state):
+    # Yearly and total growth per category from a chain state
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annual_return = np.round(state["change_sum"].to_numpy(dtype=float) / state["change_count"].to_numpy(dtype=float), 4)
+    n_dates = state["dates"].to_numpy(dtype=int)
+    total_return = np.round(annual_return * n_dates, 4)
+    single = n_dates == 1
+    annual_return[single] = 0
+    total_return[single] = 0
+    return pd.DataFrame({
+        "start_year": state["start_year"],
+        "last_year": state["last_year"],
+        "dates": n_dates,
+        "annual_return": annual_return,
+        "total_return": total_return,
+    }, index=state.index)
+
+def growth_chain(prices):
+    # One row per category with the numbers shown in the index tables
+    return chain_metrics(chain_state(prices))
+
+def index_state(df, category_column:str, calculate_volume:bool):
+    # Chain state for every category of a dataset (rows or cube), to be kept between refreshes
+    return chain_state(yearly_prices(df, category_column, calculate_volume))
+
+def append_to_index(state, rows, category_column:str, calculate_volume:bool):
+    # Update only the chains touched by a batch of newer auction rows (or cube rows)
+    return chain_state(yearly_prices(rows, category_column, calculate_volume), state)
+
+def author_index(df, calculate_volume:bool=False):
+    # growth metrics per author (rows or cube), keyed by author for lookups and joins
+    return growth_chain(yearly_prices(df, "author", calculate_volume))
+
+def partition(df, column:str="author"):
+    # (rows sorted by column, value -> slice of its rows in them). Rows keep their order within a
+    # value and values their order of first appearance, so rows.iloc[slices[value]] has the rows
+    # of df[df[column] == value] without scanning the frame. Empty values have no slice
+    codes, values = pd.factorize(df[column])
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=len(values))
+    starts = np.cumsum(counts) - counts + (codes < 0).sum()
+    slices = {value: slice(start, start + count) for value, start, count in zip(values, starts.tolist(), counts.tolist())}
+    return df.iloc[order], slices
+
+def attach_author_metrics(frame, index, column:str="annual_return", name:str="yearly_performance"):
+    # one keyed lookup for all rows instead of scanning the author table per row
+    return frame.assign(**{name: frame["author"].map(index[column])})
@@ -0,0 +1,189 @@
+import pandas as pd
+from DatasetHelper import replace_values
+
+# Dataset preparation shared by the EE and EN pages. Parent categories, technique fixes and the
+# English names are tables here instead of one .loc assignment per value, and every column is
+# renamed in a single pass over its categories. `python build.py pages` runs these once and
+# stores the results (PageDataHelper).
+
+AUCTION_DATES = (2001, 2021)
+AUCTION_TECHNIQUES = {"Mixed tech": "Mixed technique"}
+# technique -> category, temp fix
+AUCTION_CATEGORY_FIXES = {"Silk print": "Graphics", "Vitrography": "Graphics", "Wood cut": "Graphics"}
+
+HAUS_MAX_DATE = 2023
+HAUS_DEFAULT_PARENT = "Eritehnika"
+HAUS_PARENTS = {
+    "Õlimaal": "Maal",
+    "Muu maalitehnika": "Maal",
+    "Kõrgtrükk": "Graafika",
+    "Sügavtrükk": "Graafika",
+    "Lametrükk": "Graafika",
+    "Digitrükk": "Graafika",
+    "Joonistustehnika": "Joonistus",
+}
+# technique -> (category, category_parent), applied after the category based parents
+HAUS_TECHNIQUE_FIXES = {
+    "Segatehnika": ("Segatehnika", "Segatehnika"),
+    # temp fix
+    "Õli puit": ("Õlimaal", "Maal"),
+}
+HAUS_PARENT_ORDER = ["Maal", "Graafika", "Joonistus", "Segatehnika", "Eritehnika"]
+
+# (column, Estonian, English)
+HAUS_TRANSLATIONS = [
+    ("category_parent", "Maal", "Painting"),
+    ("category_parent", "Graafika", "Graphics"),
+    ("category_parent", "Segatehnika", "Mixed medium"),
+    ("category_parent", "Joonistus", "Drawing"),
+    ("category_parent", "Eritehnika", "Special"),
+
+    ("category", "Õlimaal", "Oil painting"),
+    ("category", "Teised (mitte õli) maalid", "Other (non-oil) paintings"),
+    ("category", "Segatehnika", "Mixed medium"),
+    ("category", "Graafika", "Graphics"),
+    ("category", "Joonistustehnika", "Drawing"),
+    ("category", "Sügavtrükk", "Intaglio print"),
+    ("category", "Lametrükk", "Planographic print"),
+    ("category", "Kõrgtrükk", "Relief print"),
+
+    ("technique", "Õli lõuend", "Oil on canvas"),
+    ("technique", "Õli papp", "Oil on cardboard"),
+    ("technique", "Õli vineer", "Oil on plywood"),
+    ("technique", "Õli masoniit", "Oil on masonite"),
+    ("technique", "Õli paber", "Oil on paper"),
+    ("technique", "Õli", "Oil"),
+    ("technique", "Õli puit", "Oil on wood"),
+
+    ("technique", "Akvarell", "Watercolor"),
+    ("technique", "Pastell", "Pastel"),
+    ("technique", "Akrüül", "Acrylic"),
+    ("technique", "Guašš", "Gouache"),
+
+    ("technique", "Kuivnõel", "Drypoint"),
+    ("technique", "Akvatinta", "Aquatint"),
+    ("technique", "Metsotinto", "Mezzotinto"),
+    ("technique", "Linoolsügavtrükk", "Linoleum intaglio"),
+    ("technique", "Söövitus", "Etching"),
+    ("technique", "Vasegravüür ", "Copper engraving"),
+    ("technique", "Sügavtrükk", "Intaglio print"),
+    ("technique", "Vitrograafia", "Vitrography"),
+    ("technique", "Reservaaž ", "Aquatint"),
+
+    ("technique", "Litograafia", "Lithography"),
+    ("technique", "Siiditrükk", "Silk print"),
+    ("technique", "Monotüüpia", "Monotype"),
+    ("technique", "Diatüüpia", "Diatype"),
+    ("technique", "Lametrükk", "Planographic print"),
+    ("technique", "Pehmelakk", "Soft-ground etching"),
+
+    ("technique", "Puugravüür", "Wood engraving"),
+    ("technique", "Vineerilõige", "Plywood cut"),
+    ("technique", "Linool", "Linocut"),
+    ("technique", "Kõrgtrükk", "Relief print"),
+    ("technique", "Plastikaatlõige", "Plastic cut"),
+
+    ("technique", "Joonistus", "Drawing"),
+    ("technique", "Tint", "Ink"),
+    ("technique", "Tušš", "Ink"),
+    ("technique", "Kriit", "Crayon"),
+    ("technique", "Pliiats", "Pencil"),
+    ("technique", "Süsi", "Charcoal"),
+    ("technique", "Grafiit", "Graphite"),
+    ("technique", "Sangviin", "Sanguine"),
+
+    ("technique", "Kollaaž", "Collage"),
+    ("technique", "Autoritehnika", "Author's technique"),
+    ("technique", "Pronks ", "Bronze"),
+    ("technique", "Puit", "Wood"),
+]
+
+# Treemap levels and the rows placed differently, (column, values, path) as in
+# ChartHelper.collapse_levels. The Haus values are the Estonian names, treemap_rules translates them.
+AUCTION_TREEMAP_LEVELS = ["category", "technique", "author"]
+# the technique of a mixed medium or drawing is the category again, authors go right under it
+AUCTION_TREEMAP_RULES = [
+    ("category", ["Mixed medium", "Drawing"], ["category", "author"]),
+]
+HAUS_TREEMAP_LEVELS = ["category_parent", "category", "technique", "author"]
+HAUS_TREEMAP_RULES = [
+    # no category level of their own, techniques go right under the parent
+    ("category", ["Muu maalitehnika", "Joonistustehnika", "Muu"], ["category_parent", "technique", "author"]),
+    # one technique, authors go right under the parent
+    ("category", ["Segatehnika"], ["category_parent", "author"]),
+]
+
+def translations(table:list=HAUS_TRANSLATIONS):
+    # column -> {Estonian: English}
+    mappings = {}
+    for column, estonian, english in table:
+        mappings.setdefault(column, {})[estonian] = english
+    return mappings
+
+def translate(df, table:list=HAUS_TRANSLATIONS):
+    df = df.copy()
+    for column, mapping in translations(table).items():
+        df[column] = replace_values(df[column], mapping)
+    return df
+
+def parent_order(language:str="ee"):
+    if language == "en":
+        mapping = translations()["category_parent"]
+        return [mapping.get(parent, parent) for parent in HAUS_PARENT_ORDER]
+    return list(HAUS_PARENT_ORDER)
+
+def treemap_rules(language:str="ee", rules:list=HAUS_TREEMAP_RULES):
+    if language != "en":
+        return list(rules)
+    mappings = translations()
+    return [(column, [mappings.get(column, {}).get(value, value) for value in values], path) for column, values, path in rules]
+
+def _where(series, mask, values):
+    # series with values where mask is set, stays categorical when it was
+    result = series.astype(object).where(~mask, values)
+    return result.astype("category") if isinstance(series.dtype, pd.CategoricalDtype) else result
+
+def add_price_columns(df):
+    # derived columns of the overbid treemap and the age chart
+    df["start_price"] = df["start_price"].fillna(df["end_price"])
+    df["overbid_%"] = (df["end_price"] - df["start_price"]) / df["start_price"] * 100
+    df["art_work_age"] = df["date"] - df["year"]
+    return df
+
+def prepare_auctions(df):
+    # auction rows of the Estonian index pages, English names are already in the data
+    first, last = AUCTION_DATES
+    df = df[(df["date"] >= first) & (df["date"] <= last)].copy()
+    df["date"] = df["date"].astype("int")
+    df = df.sort_values(by=["date"])
+    df["technique"] = replace_values(df["technique"], AUCTION_TECHNIQUES)
+    fixed_categories = df["technique"].astype(object).map(AUCTION_CATEGORY_FIXES)
+    df["category"] = _where(df["category"], fixed_categories.notna(), fixed_categories)
+    return add_price_columns(df)
+
+def prepare_history(df):
+    # yearly average price and volume of the index since the first auction year
+    df = df[df["date"] >= AUCTION_DATES[0]]
+    return df.groupby("date")[["volume", "avg_price"]].sum()
+
+def prepare_haus(df, language:str="ee"):
+    # rows the Haus pages work with: capitalized techniques, category_parent, the technique
+    # fixes, English names when language is "en" and the price columns, sorted by date and
+    # parent category
+    df = df[df["date"] <= HAUS_MAX_DATE].copy()
+    techniques = df["technique"].dropna().unique()
+    df["technique"] = replace_values(df["technique"], {value: value.capitalize() for value in techniques})
+
+    technique = df["technique"].astype(object)
+    parent = df["category"].astype(object).map(HAUS_PARENTS).fillna(HAUS_DEFAULT_PARENT)
+    fixed_categories = technique.map({key: fix[0] for key, fix in HAUS_TECHNIQUE_FIXES.items()})
+    fixed = fixed_categories.notna()
+    df["category_parent"] = parent.where(~fixed, technique.map({key: fix[1] for key, fix in HAUS_TECHNIQUE_FIXES.items()}))
+    df["category"] = _where(df["category"], fixed, fixed_categories)
+
+    df["cat_sort"] = df["category_parent"].map({parent: i for i, parent in enumerate(HAUS_PARENT_ORDER)})
+    if language == "en":
+        df = translate(df)
+    df = df.sort_values(by=["date", "cat_sort"])
+    df = df.dropna(subset=["author"])
+    return add_price_columns(df)
@@ -0,0 +1,70 @@
+import os
+import json
+import pyarrow as pa
+from DatasetHelper import BUILD_DIR, read_dataset, file_version, content_token
+from NormalizeHelper import prepare_auctions, prepare_history, prepare_haus
+
+# Ready-to-serve datasets of the pages. `python build.py pages` runs the cleaning of every page
+# once and writes data/build/pages/<name>.arrow (uncompressed Arrow IPC). read_page_dataset
+# memory-maps that file while it was built from the current source with the current preparation,
+# and prepares the source itself otherwise. Every dataset comes with its content_token, stored
+# in the manifest at build time so serving a built file does not hash it again.
+
+PAGE_DIR = os.path.join(BUILD_DIR, "pages")
+PAGE_MANIFEST = os.path.join(PAGE_DIR, "manifest.json")
+# bump when a prepare function changes, datasets built before are then ignored
+PREPARE_VERSION = 1
+# name -> (source file, prepare function, extra arguments)
+PAGE_DATASETS = {
+    "auctions": ("data/auctions_clean.csv", prepare_auctions, ()),
+    "history": ("data/historical_avg_price.csv", prepare_history, ()),
+    "haus_ee": ("data/haus_cleaned.csv", prepare_haus, ("ee",)),
+    "haus_en": ("data/haus_cleaned.csv", prepare_haus, ("en",)),
+}
+
+def page_version(name:str):
+    source = PAGE_DATASETS[name][0]
+    return f"{PREPARE_VERSION}-{file_version(source)}"
+
+def prepare_page_dataset(name:str):
+    source, prepare, args = PAGE_DATASETS[name]
+    return prepare(read_dataset(source), *args)
+
+def read_page_manifest():
+    if not os.path.exists(PAGE_MANIFEST):
+        return {}
+    with open(PAGE_MANIFEST) as f:
+        return json.load(f)
+
+def build_page_dataset(name:str):
+    # index is kept, the pages rely on the row labels of the source
+    os.makedirs(PAGE_DIR, exist_ok=True)
+    version = page_version(name)
+    df = prepare_page_dataset(name)
+    path = os.path.join(PAGE_DIR, name + ".arrow")
+    table = pa.Table.from_pandas(df)
+    with pa.ipc.new_file(path + ".tmp", table.schema) as writer:
+        writer.write_table(table)
+    os.replace(path + ".tmp", path)
+    manifest = read_page_manifest()
+    manifest[name] = {"version": version, "token": content_token(df), "rows": len(df)}
+    with open(PAGE_MANIFEST + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(PAGE_MANIFEST + ".tmp", PAGE_MANIFEST)
+    return path
+
+def read_arrow(path:str):
+    # numeric columns stay read-only views of the mapped file, only category codes are allocated,
+    # so the pages of every process share the same memory through the OS page cache
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+def read_page_dataset(name:str):
+    # (df, token)
+    built = read_page_manifest().get(name)
+    path = os.path.join(PAGE_DIR, name + ".arrow")
+    if built is not None and built["version"] == page_version(name) and "token" in built and os.path.exists(path):
+        return read_arrow(path), built["token"]
+    df = prepare_page_dataset(name)
+    return df, content_token(df)
@@ -0,0 +1,46 @@
+import os
+import glob
+import time
+
+# Runs the pages headlessly with streamlit's AppTest so the shared disk cache (CacheHelper) is
+# filled before the service takes traffic, e.g. `python build.py prewarm` in ExecStartPre.
+# Every page is run with its default widget states, then once per popular artist in the
+# artist selectboxes.
+
+ROOT_PAGE = "🎨_Estonian_Index_-_EN.py"
+# selectbox keys of the artist treemaps
+ARTIST_KEYS = ["1", "2"]
+POPULAR_ARTISTS = ["Konrad Mägi", "Eduard Wiiralt", "Richard Uutmaa", "Elmar Kits", "Olev Subbi"]
+
+def page_paths(archive:bool=False):
+    paths = [ROOT_PAGE] + sorted(glob.glob("pages/*.py"))
+    if archive:
+        paths += sorted(glob.glob("archive/*.py"))
+    return paths
+
+def _errors(app):
+    return [exception.value for exception in app.exception]
+
+def prewarm_page(path:str, artists:list=POPULAR_ARTISTS, timeout:float=600):
+    # {"page", "default", "artists": {artist: seconds}, "errors"}
+    from streamlit.testing.v1 import AppTest
+    start = time.time()
+    app = AppTest.from_file(os.path.abspath(path), default_timeout=timeout).run()
+    timings = {"page": path, "default": time.time() - start, "artists": {}, "errors": _errors(app)}
+    selectboxes = [key for key in ARTIST_KEYS if any(box.key == key for box in app.selectbox)]
+    if not selectboxes:
+        return timings
+    options = set(app.selectbox(key=selectboxes[0]).options)
+    for artist in artists:
+        if artist not in options:
+            continue
+        start = time.time()
+        for key in selectboxes:
+            app.selectbox(key=key).select(artist)
+        app.run()
+        timings["artists"][artist] = time.time() - start
+        timings["errors"] += _errors(app)
+    return timings
+
+def prewarm(paths:list, artists:list=POPULAR_ARTISTS):
+    return [prewarm_page(path, artists) for path in paths]
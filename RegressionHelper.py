@@ -0,0 +1,168 @@
+import pandas as pd
+import numpy as np
+from ImportHelper import lazy_import
+
+# Regression based price indices for the large scraped datasets (findartinfo Item,
+# bidtoart Art). Like IndexHelper, nothing in here depends on streamlit. scipy is imported
+# when an index is computed.
+
+# columns that identify a work when it comes back to auction, the ones present in a dataset are used
+WORK_KEYS = ["author", "title", "year", "technique", "dimension"]
+
+def prepare_scraped(df):
+    # findartinfo / bidtoart exports keep everything as text (auction_year, "12,000" prices,
+    # artist/technology on bidtoart), turn them into the columns the index code expects
+    df = df.rename(columns={"auction_year": "date", "artist": "author", "technology": "technique", "area": "dimension"})
+    for column in ["date", "start_price", "end_price", "dimension", "year"]:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column].astype(str).str.replace(",", ""), errors="coerce")
+    return df.dropna(subset=["date"])
+
+def repeat_sales_pairs(df, keys:list=None):
+    # consecutive sales of the same work in different years, with the log price ratio between them
+    if keys is None:
+        keys = [key for key in WORK_KEYS if key in df.columns]
+    sales = df.loc[df["end_price"] > 0, keys + ["date", "end_price"]].dropna()
+    work = sales.groupby(keys, sort=False, observed=True).ngroup().to_numpy()
+    dates = sales["date"].to_numpy()
+    order = np.lexsort((dates, work))
+    work = work[order]
+    dates = dates[order]
+    log_prices = np.log(sales["end_price"].to_numpy(dtype=float)[order])
+
+    resold = (work[1:] == work[:-1]) & (dates[1:] != dates[:-1])
+    return pd.DataFrame({
+        "first_date": dates[:-1][resold],
+        "second_date": dates[1:][resold],
+        "log_return": (log_prices[1:] - log_prices[:-1])[resold],
+    })
+
+def _solve(design, target):
+    lsqr = lazy_import("scipy.sparse.linalg").lsqr
+    return lsqr(design, target, atol=1e-10, btol=1e-10, iter_lim=10 * design.shape[1] + 1000)[0]
+
+def repeat_sales_index(df, keys:list=None, weighted:bool=True):
+    # Case-Shiller style repeat-sales index. Every pair of sales is one row of a sparse
+    # pair x period matrix (-1 at the first sale, +1 at the second), so memory grows with the
+    # number of pairs. Returns a df_hist shaped frame (avg_price, volume, date) with the index
+    # level scaled to the average price of the first year, plus the level itself in "index".
+    sparse = lazy_import("scipy.sparse")
+    pairs = repeat_sales_pairs(df, keys)
+    periods = np.unique(np.r_[pairs["first_date"], pairs["second_date"]])
+    levels = pd.Series(dtype=float)
+    if len(periods) > 1:
+        first = np.searchsorted(periods, pairs["first_date"].to_numpy())
+        second = np.searchsorted(periods, pairs["second_date"].to_numpy())
+        n_pairs = len(pairs)
+        rows = np.r_[np.arange(n_pairs), np.arange(n_pairs)]
+        values = np.r_[np.ones(n_pairs), -np.ones(n_pairs)]
+        design = sparse.csr_matrix((values, (rows, np.r_[second, first])), shape=(n_pairs, len(periods)))
+        # the first period is the base, its log level is 0
+        design = design[:, 1:]
+        target = pairs["log_return"].to_numpy()
+        log_levels = _solve(design, target)
+
+        if weighted and n_pairs > len(periods):
+            # second stage: squared residuals grow with the time between the two sales,
+            # weight every pair by the inverse of its fitted standard deviation
+            gaps = (pairs["second_date"] - pairs["first_date"]).to_numpy(dtype=float)
+            residuals = target - design @ log_levels
+            slope, intercept = np.polyfit(gaps, residuals ** 2, 1)
+            variance = slope * gaps + intercept
+            if (variance > 0).all():
+                weights = sparse.diags(1 / np.sqrt(variance))
+                log_levels = _solve(weights @ design, weights @ target)
+        levels = pd.Series(np.exp(np.r_[0, log_levels]), index=periods)
+
+    yearly = df.groupby("date")["end_price"]
+    dates = range(int(df["date"].min()), int(df["date"].max())+1)
+    base_price = yearly.mean().get(periods[0], np.nan) if len(periods) else np.nan
+    index = levels.reindex(dates).to_numpy()
+    return pd.DataFrame({
+        "avg_price": index * base_price,
+        "volume": yearly.sum().reindex(dates, fill_value=0).to_numpy(),
+        "date": list(dates),
+        "index": index * 100,
+    })
+
+HEDONIC_DUMMIES = ["date", "technique", "category", "author"]
+
+def _chunks(data, chunk_size:int):
+    # data is a DataFrame or the path of a CSV file, which is then read chunk by chunk
+    if isinstance(data, str):
+        return pd.read_csv(data, chunksize=chunk_size)
+    return (data.iloc[start:start+chunk_size] for start in range(0, len(data), chunk_size))
+
+def _hedonic_design(chunk, levels:dict):
+    # intercept, log dimension, artwork age (each with a missing flag) and one-hot columns
+    # for every level but the first of date, technique, category and author
+    sparse = lazy_import("scipy.sparse")
+    n_rows = len(chunk)
+    dimension = np.log1p(chunk["dimension"].to_numpy(dtype=float)) if "dimension" in chunk.columns else np.full(n_rows, np.nan)
+    age = (chunk["date"] - chunk["year"]).to_numpy(dtype=float) if "year" in chunk.columns else np.full(n_rows, np.nan)
+    numeric = [np.ones(n_rows)]
+    for values in [dimension, age]:
+        missing = np.isnan(values)
+        numeric += [np.where(missing, 0, values), missing.astype(float)]
+    rows = [np.arange(n_rows)] * len(numeric)
+    cols = [np.full(n_rows, i) for i in range(len(numeric))]
+    offset = len(numeric)
+    for column in HEDONIC_DUMMIES:
+        if column not in levels:
+            continue
+        codes = pd.Categorical(chunk[column], categories=levels[column]).codes
+        used = codes > 0
+        rows.append(np.flatnonzero(used))
+        cols.append(offset + codes[used] - 1)
+        numeric.append(np.ones(used.sum()))
+        offset += len(levels[column]) - 1
+    return sparse.csr_matrix((np.concatenate(numeric), (np.concatenate(rows), np.concatenate(cols))), shape=(n_rows, offset))
+
+def hedonic_index(data, chunk_size:int=100000):
+    # Hedonic price index: log end_price regressed on year dummies, technique, category,
+    # dimension, artwork age and author fixed effects. The data is streamed in chunks and only
+    # the (sparse) normal equations are kept, so memory does not grow with the number of rows.
+    # Returns the same df_hist shaped frame as repeat_sales_index.
+    levels = {}
+    for chunk in _chunks(data, chunk_size):
+        for column in HEDONIC_DUMMIES:
+            if column in chunk.columns:
+                # years without a positive price have no rows to fit, they come out NaN like the
+                # years without pairs of repeat_sales_index
+                values = chunk.loc[chunk["end_price"] > 0, column] if column == "date" else chunk[column]
+                levels[column] = pd.unique(np.r_[levels.get(column, []), values.dropna().to_numpy()])
+    for column in levels:
+        levels[column] = sorted(levels[column], key=lambda x: (str(type(x)), x))
+
+    xtx = None
+    xty = None
+    sums = pd.Series(dtype=float)
+    counts = pd.Series(dtype=float)
+    for chunk in _chunks(data, chunk_size):
+        chunk = chunk.dropna(subset=["date"])
+        sums = sums.add(chunk.groupby("date")["end_price"].sum(), fill_value=0)
+        counts = counts.add(chunk.groupby("date")["end_price"].count(), fill_value=0)
+        chunk = chunk[chunk["end_price"] > 0]
+        design = _hedonic_design(chunk, levels)
+        target = np.log(chunk["end_price"].to_numpy(dtype=float))
+        xtx = design.T @ design if xtx is None else xtx + design.T @ design
+        xty = design.T @ target if xty is None else xty + design.T @ target
+
+    # a tiny ridge keeps levels that lost all their rows (non-positive prices) solvable
+    sparse = lazy_import("scipy.sparse")
+    spsolve = lazy_import("scipy.sparse.linalg").spsolve
+    ridge = sparse.identity(xtx.shape[0]) * 1e-8
+    coefficients = spsolve((xtx + ridge).tocsc(), xty)
+    # year dummies come right after the intercept, dimension and age columns
+    years = levels["date"]
+    index = pd.Series(np.exp(np.r_[0, coefficients[5:5+len(years)-1]]), index=years)
+
+    dates = range(int(min(years)), int(max(years))+1)
+    index = index.reindex(dates).to_numpy()
+    base_price = sums[years[0]] / counts[years[0]]
+    return pd.DataFrame({
+        "avg_price": index * base_price,
+        "volume": sums.reindex(dates, fill_value=0).to_numpy(),
+        "date": list(dates),
+        "index": index * 100,
+    })
@@ -1,8 +1,25 @@
 import streamlit as st
 import os
+import sys
 import base64
 import pandas as pd
-import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from IndexHelper import yearly_prices, growth_chain, create_cube, author_index, partition
+from RegressionHelper import hedonic_index
+from DatasetHelper import read_dataset, file_version, content_token
+from PageDataHelper import read_page_dataset, page_version
+from CacheHelper import disk_cache, memory_cache, function_code, file_code
+from ImportHelper import preload
+from ChartHelper import compact_figure
+from ForecastHelper import forecast_series, load_forecast, build_forecast, quick_forecast, forecast_figure, FORECASTERS
+
+# first script run of the server process, statsmodels and scipy load while the page renders
+preload()
+
+# interactive sections rerun on their own when their widgets change (streamlit >= 1.33),
+# older versions rerun the whole page
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
 # https://discuss.streamlit.io/t/table-of-contents-widget/3470/12
 class Toc:
@@ -39,13 +56,13 @@ class Toc:
 
 # LOGO
 # https://discuss.streamlit.io/t/href-on-image/9693/4
-@st.cache_data(ttl=60*60*24*7, max_entries=300)
+@memory_cache
 def get_base64_of_bin_file(bin_file):
     with open(bin_file, 'rb') as f:
         data = f.read()
     return base64.b64encode(data).decode()
 
-@st.cache_data(ttl=60*60*24*7, max_entries=300)
+@memory_cache
 def get_img_with_href(local_img_path, target_url, max_width):
     img_format = os.path.splitext(local_img_path)[-1].replace('.', '')
     bin_str = get_base64_of_bin_file(local_img_path)
@@ -55,55 +72,89 @@ def get_img_with_href(local_img_path, target_url, max_width):
         </a>'''
     return html_code
 
-@st.cache_data(ttl=60*60*24*7, max_entries=300)
+@memory_cache
 def read_df(path:str):
-    return pd.read_csv(path)
-
-@st.cache_data(ttl=60*60*24*7, max_entries=300)
-def create_table(df, category_column:str, _category_list:list, calculate_volume:bool, table_height:int):
+    # Parquet built by `python build.py datasets` when available, otherwise the CSV with the same dtypes
+    return read_dataset(path)
+
+@st.cache_resource(ttl=60*60*24*7, max_entries=300)
+def get_shared_page_df(name:str, version:str):
+    # one frame per process and version, shared by every session without copying. Never
+    # modify it, use get_page_df
+    return read_page_dataset(name)
+
+def get_page_df(name:str, version:str):
+    # call with page_version(name), returns (df, token). Prepared by `python build.py pages`, or
+    # once per version when that build is missing or stale. df is a shallow view of the shared
+    # frame: columns the session adds or reassigns stay in the session, base columns are not copied.
+    # Pass the token with the frame (or the cube built from it) to the functions below
+    df, token = get_shared_page_df(name, version)
+    return df.copy(deep=False), token
+
+@memory_cache
+@disk_cache
+def get_hedonic_index(path:str, version:str):
+    # call with file_version(path), the index is only refitted when the dataset changes
+    return hedonic_index(path)
+
+@memory_cache
+def get_forecast(path:str, version:str):
+    # call with file_version(path). Reads the artifacts written by `python build.py forecasts`
+    # and only fits the model here when they are missing
+    series = forecast_series(pd.read_csv(path))
+    artifacts = load_forecast(series)
+    if artifacts is None:
+        build_forecast(series, name=path)
+        artifacts = load_forecast(series)
+    return artifacts
+
+@memory_cache
+@disk_cache
+def get_quick_forecast(path:str, version:str, backend:str="ets", horizon:int=5):
+    # fitted at request time with one of ForecastHelper.FORECASTERS on the yearly series
+    series = forecast_series(pd.read_csv(path))
+    forecast = quick_forecast(series, backend, horizon)
+    return forecast, forecast_figure(series, forecast)
+
+# "prebuilt" reads the Prophet model of `python build.py forecasts`, FORECASTERS fit at request
+# time ("prophet" in seconds, "ets" and "arima" in milliseconds)
+FORECAST_BACKENDS = ["prebuilt"] + list(FORECASTERS)
+
+def get_index_forecast(path:str, backend:str="prebuilt"):
+    # (forecast, figure) of the yearly series in path with one of FORECAST_BACKENDS
+    if backend == "prebuilt":
+        return get_forecast(path, file_version(path))
+    return get_quick_forecast(path, file_version(path), backend)
+
+@memory_cache
+@disk_cache
+def get_cube(_df, token:str):
+    # built once per dataset, every table and chart on the page reads from it
+    return create_cube(_df)
+
+@memory_cache
+@disk_cache
+def get_author_index(_cube, token:str):
+    return author_index(_cube)
+
+def create_table(df, category_column:str, category_list:list, calculate_volume:bool, table_height:int, *, token:str=None):
+    # token of df (get_page_df, get_cube), hashed from the frame when it is not given
+    return _create_table(df, token or content_token(df), category_column, category_list, calculate_volume, table_height)
+
+@memory_cache
+@disk_cache
+def _create_table(_df, token:str, category_column:str, category_list:list, calculate_volume:bool, table_height:int):
+    chains = growth_chain(yearly_prices(_df, category_column, calculate_volume)).to_dict("index")
     category_returns = []
-    for cat in _category_list:
-        df_cat = df[df[category_column]==cat]
-
-        dates = np.sort(df_cat["date"].unique())
-
-        prices = []
-        start_year = df_cat["date"].min()
-        if pd.isna(start_year):
+    for cat in category_list:
+        if cat not in chains:
             continue
-        df_cat_date = df_cat[df_cat["date"]==start_year]
-        if calculate_volume: 
-            prices.append(df_cat_date["end_price"].sum())
-        else:
-            prices.append(df_cat_date["end_price"].mean())
-        price_changes = []
-        last_year = start_year
-        for date in dates[1:]:
-            df_cat_date = df_cat[df_cat["date"]==date]
-
-            start_sum = prices[-1]
-            end_sum = 0
-            if calculate_volume: 
-                end_sum = df_cat_date["end_price"].sum()
-            else:
-                end_sum = df_cat_date["end_price"].mean()
-
-            if start_sum == 0 or end_sum == 0:
-                continue
-            price_change = (end_sum - start_sum) / start_sum * 100 / (date-last_year)
-            price_changes.append(price_change) # Kasvu arvutus
-            prices.append(end_sum) # Jätame meelde selle aasta hinna
-            last_year = date
-        annual_return = round(np.mean(price_changes), 4)
-        total_return = round(annual_return * len(dates), 4)
-        if len(dates) == 1:
-            annual_return = 0
-            total_return = 0
-        year_span = " - ".join(map(str, [round(start_year), round(last_year)]))
-        category_returns.append([cat, year_span, total_return, annual_return])
+        chain = chains[cat]
+        year_span = " - ".join(map(str, [round(chain["start_year"]), round(chain["last_year"])]))
+        category_returns.append([cat, year_span, chain["total_return"], chain["annual_return"]])
     col = ""
     # check if english language
-    is_english = df["category"].str.contains('Graphics').any() or "category_parent" in df.columns and df["category_parent"].str.contains("Graphics").any()
+    is_english = _df["category"].str.contains('Graphics').any() or "category_parent" in _df.columns and _df["category_parent"].str.contains("Graphics").any()
     
 
     if is_english:
@@ -121,4 +172,68 @@ def create_table(df, category_column:str, _category_list:list, calculate_volume:
         df_cat_returns = pd.DataFrame(category_returns, columns=[col, "Aastavahemik", "Kogukasv algusest (%)", "Iga-aastane kasv (%)"]) 
 
     #df_cat_returns = df_cat_returns.sort_values(by="Iga-aastane kasv (%)", ascending=False)
-        return df_cat_returns.drop("Kogukasv algusest (%)", axis=1)
\ No newline at end of file
+        return df_cat_returns.drop("Kogukasv algusest (%)", axis=1)
+
+@st.cache_resource(ttl=60*60*24*7, max_entries=300)
+def get_partitions(_df, token:str, name:str, column:str="author"):
+    # partition(_df, column) once per process for a frame derived from the dataset token, name
+    # tells apart frames derived from the same one. Shared by every session, never modify the rows
+    return partition(_df, column)
+
+@memory_cache
+@disk_cache
+def _cached_figure(name:str, token:str, key:str, code:str, _build, _args):
+    return compact_figure(_build(*_args), name)
+
+def cached_figure(name:str, token:str, key:str, build, *args):
+    # compacted build(*args), built once per dataset token and key (e.g. the artist of a treemap)
+    # for every session and, through the disk cache, every process. name is the key of its size in figure_report()
+    return _cached_figure(name, token, key, function_code(build), build, args)
+
+# seconds per year while an animation plays
+ANIMATION_STEP = 1.0
+
+@memory_cache
+@disk_cache
+def get_frame_figure(_frames, token:str, key:str, code:str, year, scatter_args:dict):
+    # one year of the animated scatter key, token is the dataset and code the page the frames
+    # were built from (they are filtered at module level, outside the helper modules)
+    fig = px.scatter(_frames[_frames["date"] == year], **scatter_args)
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    return compact_figure(fig, key)
+
+def lazy_animation(key:str, frames, token:str, scatter_args:dict, overview=None, overview_label:str="All years", year_label:str="Year", play_label:str="Play"):
+    # Animated scatter that sends one frame at a time instead of all of them with the page: the
+    # overview figure (or the first year) first, then the year picked on the slider or the next
+    # one every ANIMATION_STEP seconds while playing. Only this section reruns for a new frame.
+    # the calling page prepared the frames, its source is part of the frame keys
+    code = file_code(sys._getframe(1).f_code.co_filename)
+    scatter_args = dict(scatter_args)
+    color = scatter_args.get("color")
+    if color is not None and "category_orders" not in scatter_args:
+        # same colors in every year, in order of appearance like px animations
+        scatter_args["category_orders"] = {color: list(dict.fromkeys(frames[color].tolist()))}
+    years = sorted(frames["date"].unique().tolist())
+    options = ([overview_label] if overview is not None else []) + years
+    playing = st.toggle(play_label, key=f"{key}_play")
+    step = ANIMATION_STEP if playing and hasattr(st, "fragment") else None
+
+    def show_frame():
+        position_key = f"{key}_frame"
+        if playing:
+            current = st.session_state.get(position_key)
+            position = years.index(current) + 1 if current in years else 0
+            st.session_state[position_key] = years[position % len(years)]
+        selected = st.select_slider(year_label, options=options, key=position_key)
+        if selected == overview_label and overview is not None:
+            # on the axes of the yearly figures, as when the overview was their first frame
+            fig = go.Figure(overview).update_layout(margin=dict(l=5, r=5, t=5, b=5),
+                xaxis_range=scatter_args.get("range_x"), yaxis_range=scatter_args.get("range_y"))
+        else:
+            fig = get_frame_figure(frames, token, key, code, selected, scatter_args)
+        st.plotly_chart(fig, use_container_width=True)
+
+    if step is not None:
+        st.fragment(run_every=step)(show_frame)()
+    else:
+        fragment(show_frame)()
@@ -0,0 +1,83 @@
+import argparse
+import time
+import pandas as pd
+from DatasetHelper import DATASETS, build_dataset
+from PageDataHelper import PAGE_DATASETS, build_page_dataset
+from PrewarmHelper import POPULAR_ARTISTS, page_paths, prewarm_page
+from ImportHelper import import_report
+from ChartHelper import figure_report, measure_figures
+from ForecastHelper import forecast_series, build_forecast, build_forecasts, group_series
+
+# Builds the artifacts the pages read instead of computing them at render time.
+# Run after the data files change, e.g. `python build.py forecasts --groups`
+
+def run_forecasts(args):
+    for path in args.paths:
+        key = build_forecast(forecast_series(pd.read_csv(path)), name=path)
+        print(f"{path}: data/forecasts/{key}")
+    if not args.groups:
+        return
+    df = pd.read_csv(args.dataset)
+    df = df[(df["date"] >= 2001) & (df["date"] <= 2021)]
+    df["date"] = df["date"].astype("int")
+    top_authors = df.groupby("author")["end_price"].sum().sort_values(ascending=False)[:args.top_authors].index
+    series = group_series(df, "category")
+    series.update(group_series(df, "author", list(top_authors)))
+    start = time.time()
+    keys = build_forecasts(series, workers=args.workers)
+    print(f"{len(keys)} group forecasts in {time.time() - start:.1f}s")
+
+def run_datasets(args):
+    for path in args.paths:
+        print(f"{path}: {build_dataset(path)}")
+
+def run_pages(args):
+    for name in args.names:
+        start = time.time()
+        print(f"{name}: {build_page_dataset(name)} in {time.time() - start:.2f}s")
+
+def run_prewarm(args):
+    failed = False
+    measure_figures()
+    for path in args.paths or page_paths(args.archive):
+        timings = prewarm_page(path, args.artists)
+        artists = ", ".join(f"{artist} {seconds:.2f}s" for artist, seconds in timings["artists"].items())
+        print(f"{path}: {timings['default']:.2f}s" + (f" ({artists})" if artists else ""))
+        for error in timings["errors"]:
+            failed = True
+            print(f"  error: {error}")
+    imports = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in import_report().items())
+    print(f"imports: {imports}")
+    for name, (before, after) in figure_report().items():
+        print(f"{name}: {before/1024:.1f}KB -> {after/1024:.1f}KB ({before-after} bytes saved)")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build precomputed Art Index artifacts")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    forecasts = commands.add_parser("forecasts", help="fit the Prophet index forecasts")
+    forecasts.add_argument("paths", nargs="*", default=["data/historical_avg_price.csv"])
+    forecasts.add_argument("--groups", action="store_true", help="also fit one forecast per category and top author")
+    forecasts.add_argument("--dataset", default="data/auctions_clean.csv")
+    forecasts.add_argument("--top-authors", type=int, default=20)
+    forecasts.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    forecasts.set_defaults(func=run_forecasts)
+
+    datasets = commands.add_parser("datasets", help="write the datasets as Parquet with compact dtypes")
+    datasets.add_argument("paths", nargs="*", default=DATASETS)
+    datasets.set_defaults(func=run_datasets)
+
+    pages = commands.add_parser("pages", help="write the cleaned, translated datasets the pages render")
+    pages.add_argument("names", nargs="*", default=list(PAGE_DATASETS), help=", ".join(PAGE_DATASETS))
+    pages.set_defaults(func=run_pages)
+
+    prewarm = commands.add_parser("prewarm", help="run every page headlessly to fill the shared cache")
+    prewarm.add_argument("paths", nargs="*", help="pages to run, defaults to the root page and pages/*.py")
+    prewarm.add_argument("--archive", action="store_true", help="also run archive/*.py")
+    prewarm.add_argument("--artists", nargs="*", default=POPULAR_ARTISTS, help="artists to select in the artist treemaps")
+    prewarm.set_defaults(func=run_prewarm)
+
+    args = parser.parse_args()
+    args.func(args)
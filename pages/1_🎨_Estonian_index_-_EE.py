@@ -1,10 +1,11 @@
 import streamlit as st
 import plotly.express as px
-from prophet import Prophet
-from prophet.plot import plot_plotly, plot_components_plotly
 import plotly.graph_objects as go
 import pandas as pd
-from StreamlitHelper import Toc, get_img_with_href, read_df, create_table
+from StreamlitHelper import Toc, get_img_with_href, read_df, create_table, get_cube, get_author_index, get_index_forecast, FORECAST_BACKENDS, get_page_df, page_version, fragment, lazy_animation, get_partitions, cached_figure
+from IndexHelper import attach_author_metrics, cube_totals
+from ChartHelper import bin_scatter_frames, collapse_levels, treemap_nodes, treemap_figure
+from NormalizeHelper import AUCTION_TREEMAP_LEVELS, AUCTION_TREEMAP_RULES
 import numpy as np
 
 st.set_page_config(
@@ -37,21 +38,9 @@ st.markdown(inject_style_css, unsafe_allow_html=True)
 def create_paragraph(text):
     st.markdown('<span style="word-wrap:break-word;">' + text + '</span>', unsafe_allow_html=True)
     
-df = read_df('data/auctions_clean.csv')
-# Fix data
-df = df[df["date"] >= 2001]
-df = df[df["date"] <= 2021]
-df["date"] = df["date"].astype("int")
-df = df.sort_values(by=["date"])
-df.loc[df["technique"]=="Mixed tech", "technique"] = "Mixed technique"
-df_hist = read_df('data/historical_avg_price.csv')
-df_hist = df_hist[df_hist["date"] >= 2001]
-df_hist = df_hist.groupby("date").sum()
-
-#temp fix
-df.loc[df["technique"] == "Silk print", "category"] = "Graphics"
-df.loc[df["technique"] == "Vitrography", "category"] = "Graphics"
-df.loc[df["technique"] == "Wood cut", "category"] = "Graphics"
+df, token = get_page_df("auctions", page_version("auctions"))
+df_hist, _ = get_page_df("history", page_version("history"))
+cube = get_cube(df, token)
 
 # Sidebar Table of Contents
 toc = Toc()
@@ -92,25 +81,23 @@ create_paragraph('''Kunstiindeks annab ülevaate kunsti hinna tõusust ja langus
 
 # TABLE - categories average price
 toc.subheader('Tabel - ajalooline hinnakäitumine tehnika kaupa')
-table_data = create_table(df, "category", df["category"].unique(), calculate_volume=False, table_height=150)
+table_data = create_table(cube, "category", df["category"].unique(), calculate_volume=False, table_height=150, token=token)
 st.table(table_data)
 create_paragraph('''Järjestatud meediumi ehk tehnika järgi, vastavalt sellele, milline meedium domineerib enim müüdud teostes.''')
 
 # Art Index Performance Prediction
 toc.subheader('Kunstiindeksi tulemuslikkuse prognoosimine')
-df_art = pd.read_csv('./data/historical_avg_price.csv')
-df_art[['ds', 'y']] = df_art[['date', 'avg_price']]
-df_art = df_art[['ds', 'y']]
-m = Prophet()
-m.fit(df_art)
-future = m.make_future_dataframe(periods = 20428)
-forecast = m.predict(future.tail(1770))
-m.plot(forecast)
-fig1 = plot_plotly(m, forecast) 
-st.plotly_chart(fig1) 
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name='Forecast'))
-st.plotly_chart(fig, use_container_width=True)
+# reruns on its own when the model changes, not the whole page
+@fragment
+def index_forecast():
+    forecast_backend = st.selectbox('Prognoosimudel', options=FORECAST_BACKENDS, key="forecast")
+    forecast, fig1 = get_index_forecast('data/historical_avg_price.csv', forecast_backend)
+    st.plotly_chart(fig1) 
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name='Forecast'))
+    st.plotly_chart(fig, use_container_width=True)
+
+index_forecast()
 
 create_paragraph('''Selle analüüsi kohaselt prognoositakse, et kunstiindeksi hind tõuseb märkimisväärselt, tõustes 4 671,681 eurolt 2021. aasta veebruaris 5 469,599 eurole 2025. aasta detsembriks.
 ''')
@@ -129,68 +116,69 @@ Näiteks 2001. aastal oli oksjonikäive umbes 174 000 eurot, siis 2021. aastal o
 
 # TABLE - categories volume
 toc.subheader('Tabel - ajalooline mahu kasv tehnika järgi')
-table_data = create_table(df, "category", df["category"].unique(), calculate_volume=True, table_height=150)
+table_data = create_table(cube, "category", df["category"].unique(), calculate_volume=True, table_height=150, token=token)
 st.table(table_data)
 create_paragraph('''Sellest tabelist näeme, millisel meediumil on olnud suurim käive. Antud andmete põhjal näeme näiteks, et graafika on kõige populaarsem ja suurima aastase käibe kasvuprotsendiga (204% aastas 20 aasta jooksul ja 35% õlimaal samal ajal).''')
 
 # FIGURE - treemap covering categories, techniques and authors by volume and overbid
 toc.subheader('Joonis - Kunstimüük tehnika ja kunstniku järgi (alg- ja lõpphinna erinevus)')
 
-df['start_price'] = df['start_price'].fillna(df['end_price'])
-df['overbid_%'] = (df['end_price'] - df['start_price'])/df['start_price'] * 100
-df['art_work_age'] = df['date'] - df['year']
-df2 = df.groupby(['author', 'technique', 'category']).agg({'end_price':['sum'], 'overbid_%':['mean']})
-df2.columns = ['total_sales', 'overbid_%']
-df2 = df2.reset_index()
-
-df2.loc[df2["category"] == "Mixed medium", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Mixed medium", "author"] = None
-df2.loc[df2["category"] == "Drawing", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Drawing", "author"] = None
-
-artists = df2["author"].unique()
-artists = [artist for artist in artists if artist is not None]
-artists = np.concatenate([["Kõik kunstnikud"], artists])
-selected_artist =st.selectbox('Valige kunstnik', options=artists, key="1")
-if selected_artist=='Kõik kunstnikud':
-
-    fig = px.treemap(df2, path=[px.Constant("Techniques"), 'category', 'technique', 'author'], values='total_sales',
-                      color='overbid_%',
-                      color_continuous_scale='RdBu',
-                      range_color = (0, df['overbid_%'].mean() + df['overbid_%'].std() / 2),
-                      labels={
-                         "overbid_%": "Overbid (%)",
-                         "total_sales": "Total Sales",
-                         "author": "Author",
-                      })
-else:    
-    artist_df = df2[df2["author"] == selected_artist]
-    fig = px.treemap(artist_df, path=["author", "category", "technique"], values="total_sales",
-                    color="overbid_%", color_continuous_scale="RdBu",
-                    range_color=(-20, 100), labels={
-                        "yearly_performance": "Historical Performance (%)",
-                        "total_sales": "Total Sales",
-                        "author": "Author",
-                    })
+df2 = cube_totals(cube, ['author', 'technique', 'category'])
+df2 = collapse_levels(df2, AUCTION_TREEMAP_LEVELS, AUCTION_TREEMAP_RULES)
+
+artist_rows, artist_slices = get_partitions(df2, token, "treemap_overbid")
+artists = np.concatenate([["Kõik kunstnikud"], list(artist_slices)])
+
+def treemap_overbid(df2, artist_rows, artist_slices, selected_artist, overbid_range):
+    if selected_artist=='Kõik kunstnikud':
+
+        nodes = treemap_nodes(df2, AUCTION_TREEMAP_LEVELS, "total_sales", "overbid_%", "Techniques")
+        fig = treemap_figure(nodes, "total_sales", "overbid_%",
+                          color_continuous_scale='RdBu',
+                          range_color = overbid_range,
+                          labels={
+                             "overbid_%": "Overbid (%)",
+                             "total_sales": "Total Sales",
+                             "author": "Author",
+                          })
+    else:    
+        artist_df = artist_rows.iloc[artist_slices[selected_artist]]
+        nodes = treemap_nodes(artist_df, ["author", "category", "technique"], "total_sales", "overbid_%")
+        fig = treemap_figure(nodes, "total_sales", "overbid_%", color_continuous_scale="RdBu",
+                        range_color=(-20, 100), labels={
+                            "yearly_performance": "Historical Performance (%)",
+                            "total_sales": "Total Sales",
+                            "author": "Author",
+                        })
 
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total Sales: %{value}<br> Overbid (%): %{color:.2f}',)
-st.plotly_chart(fig, use_container_width=True)
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total Sales: %{value}<br> Overbid (%): %{color:.2f}',)
+    return fig
+
+# reruns on its own when the artist changes, not the whole page
+@fragment
+def artist_treemap_overbid(df2, artist_rows, artist_slices, artists, overbid_range):
+    selected_artist =st.selectbox('Valige kunstnik', options=artists, key="1")
+    # built once per artist and dataset for every session
+    fig = cached_figure("auctions_ee_treemap_overbid", token, selected_artist, treemap_overbid, df2, artist_rows, artist_slices, selected_artist, overbid_range)
+    st.plotly_chart(fig, use_container_width=True)
+
+    if selected_artist!='Kõik kunstnikud':
+        artist_df = artist_rows.iloc[artist_slices[selected_artist]]
+        columns = ["author", "category", "technique", "total_sales", "overbid_%"]
+        data = artist_df[columns]
 
-if selected_artist!='Kõik kunstnikud':
-    artist_df = df2[df2["author"] == selected_artist]
-    columns = ["author", "category", "technique", "total_sales", "overbid_%"]
-    data = artist_df[columns]
+        data = data.rename(columns={
+            "author":"Kunstnik",
+            "category":"Kategooria",
+            "technique":"Tehnika",
+            "total_sales": "Müük kokku",
+            "overbid_%": "Ülepakkumise %",
+        })
+        data = data.reset_index(drop=True)
+        st.write(data)
 
-    data = data.rename(columns={
-        "author":"Kunstnik",
-        "category":"Kategooria",
-        "technique":"Tehnika",
-        "total_sales": "Müük kokku",
-        "overbid_%": "Ülepakkumise %",
-    })
-    data = data.reset_index(drop=True)
-    st.write(data)
+artist_treemap_overbid(df2, artist_rows, artist_slices, artists, (0, df['overbid_%'].mean() + df['overbid_%'].std() / 2))
 
 
 create_paragraph('''Tehnikad ja kunstnikud, kus värviskaala annab meile ülevaate, kui palju kunsti on oksjonite ajal ülepakkumisi tehtud ning mahud on järjestatud tehnika ja kunstniku järgi.
@@ -199,67 +187,68 @@ Näiteks sinine värv näitab kunstnikke ja meediume, mille puhul oli ülepakkum
 
 # FIGURE - treemap covering categories, techniques and authors by volume and overbid
 toc.subheader('Joonis - Kunstimüük tehnika ja kunstniku järgi (ajalooline hinnakäitumine)')
-table_data = create_table(df, "author", list(df["author"].unique()), calculate_volume=False, table_height=250)
-df["yearly_performance"] = [table_data[table_data["Author"] == x]["Yearly growth (%)"] for x in df["author"]]
-df2 = df.groupby(['author', 'technique', 'category']).agg({'end_price':['sum'], 'yearly_performance':['mean']})
-df2.columns = ['total_sales', 'yearly_performance']
-df2 = df2.reset_index()
-
-df2.loc[df2["category"] == "Mixed medium", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Mixed medium", "author"] = None
-
-df2.loc[df2["category"] == "Drawing", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Drawing", "author"] = None
-
-artists = df2["author"].unique()
-artists = [artist for artist in artists if artist is not None]
-artists = np.concatenate([["Kõik kunstnikud"], artists])
-
-selected_artist2 =st.selectbox('Valige kunstnik', options=artists, key="2")
-if selected_artist2=='Kõik kunstnikud':
-
-    fig = px.treemap(df2, path=[px.Constant("Techniques"), 'category', 'technique', 'author'], values='total_sales',
-                      color='yearly_performance',
-                      color_continuous_scale='RdBu',
-                      range_color = (-20, 100),
-                      labels={
-                         "yearly_performance": "Historical Performance (%)",
-                         "total_sales": "Total Sales",
-                         "author": "Author",
-                      })
-else:    
-    artist_df = df2[df2["author"] == selected_artist2]
-
-    fig = px.treemap(artist_df, path=[px.Constant("Techniques"), 'category', 'technique', 'author'], values='total_sales',
-                        color='yearly_performance',
-                        color_continuous_scale='RdBu',
-                        range_color = (-20, 100),
-                        labels={
-                            "yearly_performance": "Historical Performance (%)",
-                            "total_sales": "Total Sales",
-                            "author": "Author",
-                        })
-
-
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total sales: %{value}<br> Annual return (%): %{color:.2f}',)
-st.plotly_chart(fig, use_container_width=True)
-
-if selected_artist2!='Kõik kunstnikud':
-
-    artist_df = df2[df2["author"] == selected_artist2]
-    columns = ["category", "technique", "author", "total_sales", "yearly_performance"]
-    data = artist_df[columns]
-
-    data = data.rename(columns={
-        "author":"Kunstnik",
-        "category":"Kategooria",
-        "technique":"Tehnika",
-        "total_sales": "Müük kokku",
-        "yearly_performance": "Ajaloolised tulemused (%)",
-    })
-    data = data.reset_index(drop=True)
-    st.write(data)
+df2 = cube_totals(cube, ['author', 'technique', 'category']).drop("overbid_%", axis=1)
+df2 = attach_author_metrics(df2, get_author_index(cube, token))
+df2 = collapse_levels(df2, AUCTION_TREEMAP_LEVELS, AUCTION_TREEMAP_RULES)
+
+artist_rows, artist_slices = get_partitions(df2, token, "treemap_performance")
+artists = np.concatenate([["Kõik kunstnikud"], list(artist_slices)])
+
+def treemap_performance(df2, artist_rows, artist_slices, selected_artist2):
+    if selected_artist2=='Kõik kunstnikud':
+
+        nodes = treemap_nodes(df2, AUCTION_TREEMAP_LEVELS, "total_sales", "yearly_performance", "Techniques")
+        fig = treemap_figure(nodes, "total_sales", "yearly_performance",
+                          color_continuous_scale='RdBu',
+                          range_color = (-20, 100),
+                          labels={
+                             "yearly_performance": "Historical Performance (%)",
+                             "total_sales": "Total Sales",
+                             "author": "Author",
+                          })
+    else:    
+        artist_df = artist_rows.iloc[artist_slices[selected_artist2]]
+
+        nodes = treemap_nodes(artist_df, AUCTION_TREEMAP_LEVELS, "total_sales", "yearly_performance", "Techniques")
+        fig = treemap_figure(nodes, "total_sales", "yearly_performance",
+                            color_continuous_scale='RdBu',
+                            range_color = (-20, 100),
+                            labels={
+                                "yearly_performance": "Historical Performance (%)",
+                                "total_sales": "Total Sales",
+                                "author": "Author",
+                            })
+
+
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total sales: %{value}<br> Annual return (%): %{color:.2f}',)
+    return fig
+
+# reruns on its own when the artist changes, not the whole page
+@fragment
+def artist_treemap_performance(df2, artist_rows, artist_slices, artists):
+    selected_artist2 =st.selectbox('Valige kunstnik', options=artists, key="2")
+    # built once per artist and dataset for every session
+    fig = cached_figure("auctions_ee_treemap_performance", token, selected_artist2, treemap_performance, df2, artist_rows, artist_slices, selected_artist2)
+    st.plotly_chart(fig, use_container_width=True)
+
+    if selected_artist2!='Kõik kunstnikud':
+
+        artist_df = artist_rows.iloc[artist_slices[selected_artist2]]
+        columns = ["category", "technique", "author", "total_sales", "yearly_performance"]
+        data = artist_df[columns]
+
+        data = data.rename(columns={
+            "author":"Kunstnik",
+            "category":"Kategooria",
+            "technique":"Tehnika",
+            "total_sales": "Müük kokku",
+            "yearly_performance": "Ajaloolised tulemused (%)",
+        })
+        data = data.reset_index(drop=True)
+        st.write(data)
+
+artist_treemap_performance(df2, artist_rows, artist_slices, artists)
 
 
 create_paragraph('''
@@ -268,11 +257,11 @@ Tehnikad ja kunstnikud, kus värviskaala annab meile ülevaate ajaloolistest hin
 Näiteks sinine värv näitab kunstnikke ja meediume, mille ajalooline hinnakasv oli kõige suurem. Kunstniku nime kõrval on näidatud ka maht. Näiteks Konrad Mägi on kõige rohkem müüdud kunstiteoseid, kuid see tabel näitab, et kõrgeim keskmine ajalooline hind läheb Karin Lutsu töödele (498,84 % keskmine hinnakasv aastate jooksul, samas kui Konrad Mägi puhul on see arv 198,95 %). Kuigi Konrad Mägi on mahu poolest Lutsist ikka veel üle.''')
 
 # TABLE - best authors average price
-author_sum = df.groupby(["author"], sort=False)["end_price"].sum()
+author_sum = cube.groupby(["author"], sort=False)["end_price_sum"].sum()
 top_authors = author_sum.sort_values(ascending=False)[:10]
 
 toc.subheader('Tabel - Top 10 parima tulemusega kunstnikud (hinnakäitumine)')
-table_data = create_table(df, "author", top_authors.index, calculate_volume=False, table_height=250)    
+table_data = create_table(cube, "author", top_authors.index, calculate_volume=False, table_height=250, token=token)    
 st.table(table_data)
 create_paragraph('''Selles tabelis on esitatud kõige populaarsemad kunstnikud ja nende ajalooline hinnakasvuprotsent. Protsent on arvutatud aasta keskmiste lõpphindade erinevuste põhjal.
 
@@ -280,29 +269,29 @@ Tabeli liider on Konrad Mägi, kelle kasvuprotsent on keskmiselt 198,95%. Seda k
 
 # TABLE - best authors volume
 toc.subheader('Tabel - 10 kõige edukamat artisti (mahu kasv)')
-table_data = create_table(df, "author", top_authors.index, calculate_volume=True, table_height=250)    
+table_data = create_table(cube, "author", top_authors.index, calculate_volume=True, table_height=250, token=token)    
 st.table(table_data)
 create_paragraph('''Selles tabelis on esitatud kunstiteoste käive ja keskmine aastane kasv. Siin on Wiiralt 8. kohal ja Konrad Mägi 1. kohal. Kuna kasvuprotsent on kogu perioodi (2001-2021) käibe kohta, siis asuvad tabeli tipus kunstnikud, kelle teoseid on kõige rohkem ostetud.
 ''')
 
 # FIGURE - date and price
 toc.subheader('Joonis - Kunstiteose vanus vs. hind')
-df['art_work_age'] = df['date'] - df['year']
 q_low = df["end_price"].quantile(0.1)
 q_hi  = df["end_price"].quantile(0.9)
 df = df[(df["end_price"] < q_hi) & (df["end_price"] > q_low)]
-fig = px.scatter(df.dropna(subset=["decade"]), x="art_work_age", y="end_price", color="category",
-                 animation_frame="date", animation_group="technique", hover_name="technique",
-                 size='date', hover_data=['author'], size_max=15, range_x=[-4,130], range_y=[-1000,8200],
-                 labels={
-                     "end_price": "Oksjoni lõplik müügihind (€)",
-                     "art_work_age": "Kunstitöö vanus",
-                     "author": "Autor",
-                     "category": "Tehnika",
-                     "decade": "Aastakümnend"
-                  })
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-st.plotly_chart(fig, use_container_width=True)
+frames = bin_scatter_frames(df.dropna(subset=["decade"]), "art_work_age", "end_price", "category", keep=["technique", "author"])
+lazy_animation("auctions_ee_age", frames, token, dict(
+    x="art_work_age", y="end_price", color="category",
+    hover_name="technique",
+    size='date', hover_data=['author'], size_max=15, range_x=[-4,130], range_y=[-1000,8200],
+    labels={
+        "end_price": "Oksjoni lõplik müügihind (€)",
+        "art_work_age": "Kunstitöö vanus",
+        "author": "Autor",
+        "category": "Tehnika",
+        "decade": "Aastakümnend"
+     }),
+    year_label="Aasta", play_label="Mängi")
 create_paragraph('''Antud graafiku põhjal on võimalik määrata teose hinda vastavalt kunstiteose vanusele ja tehnikale. Tehnikad on eristatud värvide kaupa.
 
 Vanim töö pärineb aastast 1900, kuid ei ole kõige kallim. Üldiselt on näha, et vanemad tööd on kallimad, välja arvatud Olev Subbi. On näha, et Teise maailmasõja eelsed tööd aastatest 1910-1940 on müüdud kallimalt.''')
@@ -313,17 +302,18 @@ df["dimension"] = df["dimension"] / (100*100)
 q_low = df["dimension"].quantile(0.1)
 q_hi  = df["dimension"].quantile(0.9)
 df = df[(df["dimension"] < q_hi) & (df["dimension"] > q_low)]
-fig = px.scatter(df.dropna(subset=["dimension"]), x="dimension", y="end_price", color="category",
-                 animation_frame="date", animation_group="technique", hover_name="technique",
-                 size='date', hover_data=['author'], size_max=15, range_x=[-0.03, 4], range_y=[-1000,8200],
-                 labels={
-                     "end_price": "Oksjoni lõplik müügihind (€)",
-                     "dimension": "Mõõtmed (m²)",
-                     "author": "Autor",
-                     "category": "Tehnika",
-                  })
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-st.plotly_chart(fig, use_container_width=True)
+frames = bin_scatter_frames(df, "dimension", "end_price", "category", keep=["technique", "author"])
+lazy_animation("auctions_ee_size", frames, token, dict(
+    x="dimension", y="end_price", color="category",
+    hover_name="technique",
+    size='date', hover_data=['author'], size_max=15, range_x=[-0.03, 4], range_y=[-1000,8200],
+    labels={
+        "end_price": "Oksjoni lõplik müügihind (€)",
+        "dimension": "Mõõtmed (m²)",
+        "author": "Autor",
+        "category": "Tehnika",
+     }),
+    year_label="Aasta", play_label="Mängi")
 create_paragraph('''Ülevaade töö mõõtmete, tehnika ja hinna vahelisest suhtest. Paljud väiksema formaadiga tööd on sageli kallimad kui suured. Teose suurus ei tähenda tingimata, et see on kallim. Pigem on olulisem autor ja kui teose suurus. Näiteks Konrad Mägi Õlimaa on mõõtkavas keskmiste hulgas, kuid hinnaskaalal teistest tunduvalt kõrgemal (127 823 eurot haamrihind), samas kui suurima teose (Toomas Vint) haamrihind on 7094 eurot.''')
 
 def create_credits(text):
@@ -335,7 +325,7 @@ create_credits('''Other credits: Inspired by the original Estonian Art Index cre
 
 toc.generate()
 
-@st.cache()
+@st.cache_data
 def convert_df():
     # IMPORTANT: Cache the conversion to prevent computation on every rerun
     return read_df('data/auctions_clean.csv').to_csv().encode('utf-8')
@@ -2,8 +2,10 @@ import streamlit as st
 import plotly.express as px
 import pandas as pd
 import plotly.graph_objects as go
-from StreamlitHelper import Toc, get_img_with_href, read_df, create_table
-import statsmodels.api as sm
+from StreamlitHelper import Toc, get_img_with_href, read_df, get_page_df, page_version, create_table, get_cube, get_author_index, lazy_animation, cached_figure
+from IndexHelper import attach_author_metrics, cube_totals, cube_history
+from ChartHelper import bin_scatter_frames, collapse_levels, treemap_nodes, treemap_figure
+from NormalizeHelper import parent_order, treemap_rules, HAUS_TREEMAP_LEVELS
 
 st.set_page_config(
     page_title="Art Index",
@@ -41,33 +43,9 @@ def create_credits(text):
 toc = Toc()
 toc.placeholder(sidebar=True)
 
-df = read_df('data/haus_cleaned.csv')
-#df = df[df["date"] >= 2001]
-df = df[df["date"] <= 2023]
-df["technique"] = df["technique"].str.capitalize() 
-
-df["category_parent"] = "Eritehnika"
-df.loc[df["category"] == "Õlimaal", "category_parent"] = "Maal"
-df.loc[df["category"] == "Muu maalitehnika", "category_parent"] = "Maal"
-
-df.loc[df["category"] == "Kõrgtrükk", "category_parent"] = "Graafika"
-df.loc[df["category"] == "Sügavtrükk", "category_parent"] = "Graafika"
-df.loc[df["category"] == "Lametrükk", "category_parent"] = "Graafika"
-df.loc[df["category"] == "Digitrükk", "category_parent"] = "Graafika"
-
-df.loc[df["category"] == "Joonistustehnika", "category_parent"] = "Joonistus"
-
-df.loc[df["technique"] == "Segatehnika", "category_parent"] = "Segatehnika"
-df.loc[df["technique"]=="Segatehnika", "category"] = "Segatehnika" 
-
-#temp fix
-df.loc[df["technique"] == "Õli puit", "category"] = "Õlimaal"
-df.loc[df["technique"] == "Õli puit", "category_parent"] = "Maal"
-
-order_categories = ["Maal", "Graafika", "Joonistus", "Segatehnika", "Eritehnika"]
-df["cat_sort"] = [order_categories.index(x) for x in df["category_parent"]]
-df = df.sort_values(by=["date", "cat_sort"])
-df = df.dropna(subset=["author"])
+df, token = get_page_df("haus_ee", page_version("haus_ee"))
+order_categories = parent_order("ee")
+cube = get_cube(df, token)
 
 kanvas_logo = get_img_with_href('data/horisontal-BLACK.png', 'https://kanvas.ai', '200px')
 st.sidebar.markdown(kanvas_logo, unsafe_allow_html=True)
@@ -123,15 +101,7 @@ df_top_20.index += 1
 df_styled = df_top_20.style.format(formatter="{:}")
 st.dataframe(df_styled)
 
-prices = []
-volumes = []
-dates = []
-for year in range(df["date"].min(), df["date"].max()+1):
-    dates.append(year)
-    prices.append(df[df["date"] == year]["end_price"].mean())
-    volumes.append(df[df["date"] == year]["end_price"].sum())
-data = {'avg_price': prices, 'volume': volumes, 'date': dates}
-df_hist = pd.DataFrame.from_dict(data)
+df_hist = cube_history(cube)
 
 # FIGURE - date and average price
 toc.subheader('Joonis - Hinnanäitaja ajas')
@@ -142,8 +112,8 @@ fig = px.area(df_hist, x="date", y="avg_price",
              })
 fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
 # unfinished trendlines
-fig2 = px.scatter(df_hist, x="date", y="avg_price", trendline="ols")
-fig2.data = [t for t in fig2.data if t.mode == "lines"]
+#fig2 = px.scatter(df_hist, x="date", y="avg_price", trendline="ols")
+#fig2.data = [t for t in fig2.data if t.mode == "lines"]
 #fig = go.Figure(data= fig.data + fig2.data)
 
 st.plotly_chart(fig, use_container_width=True)
@@ -153,7 +123,7 @@ See joonis näitab keskmise kunstiteose hinna kõikumist aastate vältel.
 
 # TABLE - categories average price
 toc.subheader('Tabel - Hinnanäitaja ajas, tehnikate kaupa')
-table_data = create_table(df.dropna(subset=["date"]), "category_parent", order_categories[:-1], calculate_volume=False, table_height=150)
+table_data = create_table(cube, "category_parent", order_categories[:-1], calculate_volume=False, table_height=150, token=token)
 st.table(table_data)
 create_paragraph('See tabel näitab üldisemate tehnikate keskmise hinna kõikumist aastate vahemikus.')
 
@@ -166,8 +136,8 @@ fig = px.area(df_hist, x="date", y="volume",
              })
 fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
 # unfinished trendlines
-fig2 = px.scatter(df_hist, x="date", y="volume", trendline="ols")
-fig2.data = [t for t in fig2.data if t.mode == "lines"]
+#fig2 = px.scatter(df_hist, x="date", y="volume", trendline="ols")
+#fig2.data = [t for t in fig2.data if t.mode == "lines"]
 #fig = go.Figure(data= fig.data + fig2.data)
 
 st.plotly_chart(fig, use_container_width=True)
@@ -177,55 +147,18 @@ See joonis näitab oksjonite müügimahu kõikumisi aastate vältel.
 
 # TABLE - categories volume
 toc.subheader('Tabel - Müügimahu kasv ajas, tehnikate kaupa')
-table_data = create_table(df.dropna(subset=["date"]), "category_parent", order_categories[:-1], calculate_volume=True, table_height=150)
+table_data = create_table(cube, "category_parent", order_categories[:-1], calculate_volume=True, table_height=150, token=token)
 st.table(table_data)
 create_paragraph('See tabel näitab üldisemate tehnikate volüümi kõikumist aastate vahemikus.')
 
 # FIGURE - treemap covering categories, techniques and authors by volume and overbid
 toc.subheader('Joonis - Haamrihinnad tehnika ja kunstniku järgi (alghinna ja haamrihinna võrdlus)')
 
-df['start_price'] = df['start_price'].fillna(df['end_price'])
-@st.cache(ttl=60*60*24*7, max_entries=300, allow_output_mutation=True)
-def create_treemap_overbid():
-    df['overbid_%'] = (df['end_price'] - df['start_price'])/df['start_price'] * 100
-    df2 = df[df["technique"] != " "]
-    df2.loc[df2["category"] == "Muu maalitehnika", "category"] = df2["technique"]
-
-    df2 = df2.groupby(['author', 'technique', 'category', 'category_parent']).agg({'end_price':['sum'], 'overbid_%':['mean']})
-    df2.columns = ['total_sales', 'overbid_%']
-    df2 = df2.reset_index()
-
-    # fix treemap parenting
-    df2.loc[df2["category"] == "Muu maalitehnika", "category"] = df2["technique"]
-    df2.loc[df2["technique"] == "Tempera", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Tempera", "author"] = None
-
-    df2.loc[df2["technique"] == "Akvarell", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Akvarell", "author"] = None
-
-    df2.loc[df2["technique"] == "Pastell", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Pastell", "author"] = None
-
-    df2.loc[df2["technique"] == "Akrüül", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Akrüül", "author"] = None
-
-    df2.loc[df2["technique"] == "Guašš", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Guašš", "author"] = None
-
-    df2.loc[df2["category"] == "Joonistustehnika", "category"] = df2["technique"]
-    df2.loc[df2["category_parent"] == "Joonistus", "technique"] = df2["author"]
-    df2.loc[df2["category_parent"] == "Joonistus", "author"] = None
-
-    df2.loc[df2["category"] == "Muu", "category"] = df2["technique"]
-    df2.loc[df2["category_parent"] == "Eritehnika", "technique"] = df2["author"]
-    df2.loc[df2["category_parent"] == "Eritehnika", "author"] = None
-
-    df2.loc[df2["category"] == "Segatehnika", "category"] = df2["author"]
-    df2.loc[df2["category_parent"] == "Segatehnika", "technique"] = None
-    df2.loc[df2["category_parent"] == "Segatehnika", "author"] = None
-
-    fig = px.treemap(df2, path=[px.Constant("Tehnikad"), 'category_parent', 'category', 'technique', 'author'], values='total_sales',
-                      color='overbid_%',
+def create_treemap_overbid(df, cube):
+    df2 = cube_totals(cube[cube["technique"] != " "], ['author', 'technique', 'category', 'category_parent'])
+    df2 = collapse_levels(df2, HAUS_TREEMAP_LEVELS, treemap_rules("ee"))
+    nodes = treemap_nodes(df2, HAUS_TREEMAP_LEVELS, "total_sales", "overbid_%", "Tehnikad")
+    fig = treemap_figure(nodes, "total_sales", "overbid_%",
                       color_continuous_scale='RdBu',
                       range_color = (0, df['overbid_%'].mean() + df['overbid_%'].std()),
                       labels={
@@ -233,10 +166,12 @@ def create_treemap_overbid():
                          "total_sales": "Kogumüük",
                          "author": "Autor",
                       })
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    fig.update_traces(hovertemplate='<b>%{label} </b> <br> Kogumüük: %{value}<br> Ülepakkumine (%): %{color:.2f}',)
     return fig
-fig = create_treemap_overbid()
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-fig.update_traces(hovertemplate='<b>%{label} </b> <br> Kogumüük: %{value}<br> Ülepakkumine (%): %{color:.2f}',)
+
+# built once per dataset for every session
+fig = cached_figure("haus_ee_treemap_overbid", token, "all", create_treemap_overbid, df, cube)
 st.plotly_chart(fig, use_container_width=True)
 create_paragraph('''
 See joonis näitab müügi kogutulu autorite ja tehnikate lõikes detailsemalt, kus üldised tehnikad on jaotatud alamtehnikateks. Värviga on eristatud alghinnast ülepakkumine.
@@ -245,44 +180,13 @@ See joonis näitab müügi kogutulu autorite ja tehnikate lõikes detailsemalt,
 # FIGURE - treemap covering categories, techniques and authors by volume and overbid
 toc.subheader('Joonis - Haamrihinnad tehnika ja kunstniku järgi (aastatulu)')
 
-@st.cache(ttl=60*60*24*7, max_entries=300, allow_output_mutation=True)
-def create_treemap_yearly():
-    table_data = create_table(df, "author", list(df["author"].unique()), calculate_volume=False, table_height=250)
-    df["yearly_performance"] = [table_data[table_data["Autor"] == x]["Iga-aastane kasv (%)"] for x in df["author"]]
-    df2 = df.groupby(['author', 'technique', 'category', 'category_parent']).agg({'end_price':['sum'], 'yearly_performance':['mean']})
-    df2.columns = ['total_sales', 'yearly_performance']
-    df2 = df2.reset_index()
-
-    # fix treemap parenting
-    df2.loc[df2["category"] == "Muu maalitehnika", "category"] = df2["technique"]
-    df2.loc[df2["technique"] == "Tempera", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Tempera", "author"] = None
-
-    df2.loc[df2["technique"] == "Akvarell", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Akvarell", "author"] = None
-
-    df2.loc[df2["technique"] == "Pastell", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Pastell", "author"] = None
-
-    df2.loc[df2["technique"] == "Akrüül", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Akrüül", "author"] = None
+def create_treemap_yearly(cube, author_index):
+    df2 = cube_totals(cube, ['author', 'technique', 'category', 'category_parent']).drop("overbid_%", axis=1)
+    df2 = attach_author_metrics(df2, author_index)
 
-    df2.loc[df2["technique"] == "Guašš", "technique"] = df2["author"]
-    df2.loc[df2["category"] == "Guašš", "author"] = None
-
-    df2.loc[df2["category"] == "Joonistustehnika", "category"] = df2["author"]
-    df2.loc[df2["category_parent"] == "Joonistus", "author"] = None
-
-    df2.loc[df2["category"] == "Muu", "category"] = df2["technique"]
-    df2.loc[df2["category_parent"] == "Eritehnika", "technique"] = df2["author"]
-    df2.loc[df2["category_parent"] == "Eritehnika", "author"] = None
-
-    df2.loc[df2["category"] == "Segatehnika", "category"] = df2["author"]
-    df2.loc[df2["category_parent"] == "Segatehnika", "technique"] = None
-    df2.loc[df2["category_parent"] == "Segatehnika", "author"] = None
-
-    fig = px.treemap(df2, path=[px.Constant("Tehnikad"), 'category_parent', 'category', 'technique', 'author'], values='total_sales',
-                      color='yearly_performance',
+    df2 = collapse_levels(df2, HAUS_TREEMAP_LEVELS, treemap_rules("ee"))
+    nodes = treemap_nodes(df2, HAUS_TREEMAP_LEVELS, "total_sales", "yearly_performance", "Tehnikad")
+    fig = treemap_figure(nodes, "total_sales", "yearly_performance",
                       color_continuous_scale='RdBu',
                       range_color = (-20, 100),
                       labels={
@@ -290,22 +194,23 @@ def create_treemap_yearly():
                          "total_sales": "Kogumüük",
                          "author": "Autor",
                       })
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    fig.update_traces(hovertemplate='<b>%{label} </b> <br> Kogumüük: %{value}<br> Aasta tootlus (%): %{color:.2f}',)
     return fig
 
-fig = create_treemap_yearly()
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-fig.update_traces(hovertemplate='<b>%{label} </b> <br> Kogumüük: %{value}<br> Aasta tootlus (%): %{color:.2f}',)
+# built once per dataset for every session
+fig = cached_figure("haus_ee_treemap_yearly", token, "all", create_treemap_yearly, cube, get_author_index(cube, token))
 st.plotly_chart(fig, use_container_width=True)
 create_paragraph('''
 See joonis näitab müügi kogutulu autorite ja tehnikate lõikes detailsemalt, kus üldised tehnikad on jaotatud alamtehnikateks. Värviga on eristatud kunstiteoste aasta tootlused.
 ''')
 
 # TABLE - best authors average price
-author_sum = df.groupby(["author"], sort=False)["end_price"].sum()
+author_sum = cube.groupby(["author"], sort=False)["end_price_sum"].sum()
 top_authors = author_sum.sort_values(ascending=False)[:25]
 
 toc.subheader('Tabel - Top 25 enim müüdud kunstnike teoste hinnakasv')
-table_data = create_table(df, "author", top_authors.index, calculate_volume=False, table_height=250)    
+table_data = create_table(cube, "author", top_authors.index, calculate_volume=False, table_height=250, token=token)    
 st.table(table_data)
 create_paragraph('''
 See tabel näitab (alates suurima kogutuluga autorist) autorite teoste keskmist hinnakasvu aastas.
@@ -313,7 +218,7 @@ See tabel näitab (alates suurima kogutuluga autorist) autorite teoste keskmist
 
 # TABLE - best authors volume
 toc.subheader('Tabel - Top 25 enim müüdud kunstnike teoste müügimahu kasv')
-table_data = create_table(df, "author", top_authors.index, calculate_volume=True, table_height=250)    
+table_data = create_table(cube, "author", top_authors.index, calculate_volume=True, table_height=250, token=token)    
 st.table(table_data)
 create_paragraph('''
 See tabel näitab (alates suurima kogutuluga autorist) autorite teoste kogutulu kasvu aastas.
@@ -321,7 +226,6 @@ See tabel näitab (alates suurima kogutuluga autorist) autorite teoste kogutulu
 
 # FIGURE - date and price
 toc.subheader('Joonis - Kunstiteose vanus vs hind')
-df['art_work_age'] = df['date'] - df['year']
 
 df2 = df[df["technique"] != " "]
 df2 = df2[df["category_parent"] != "Eritehnika"]
@@ -341,21 +245,19 @@ fig_all = px.scatter(df3.dropna(subset=['age']), x="age", y="sales", color="cate
                      "date":"Aasta",
                   })
 
-fig = px.scatter(df2.dropna(subset=["decade"]), x="art_work_age", y="end_price", color="category_parent",
-                 animation_frame="date", animation_group="category_parent", hover_name="category_parent",
-                 size='date', size_max=15, range_x=[-2,125], range_y=[-200,15000],
-                 labels={
-                     "end_price": "Haamrihind (€)",
-                     "art_work_age": "Kunstiteose vanus",
-                     "category_parent": "Tehnika",
-                     "decade": "Kümnend",
-                     "date":"Aasta",
-                  })
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-
-fig = go.Figure(data=fig_all.data, frames=fig['frames'], layout=fig.layout)
-
-st.plotly_chart(fig, use_container_width=True)
+frames = bin_scatter_frames(df2.dropna(subset=["decade"]), "art_work_age", "end_price", "category_parent")
+lazy_animation("haus_ee_age", frames, token, dict(
+    x="art_work_age", y="end_price", color="category_parent",
+    hover_name="category_parent",
+    size='date', size_max=15, range_x=[-2,125], range_y=[-200,15000],
+    labels={
+        "end_price": "Haamrihind (€)",
+        "art_work_age": "Kunstiteose vanus",
+        "category_parent": "Tehnika",
+        "decade": "Kümnend",
+        "date":"Aasta",
+     }),
+    overview=fig_all, overview_label="Kõik aastad", year_label="Aasta", play_label="Mängi")
 create_paragraph('''
 See joonis näitab kunstiteoste keskmist hinda ja vanust tehnikate kaupa. Animatsiooni käivitades näeb võrdlust aastate kaupa.
 ''')
@@ -384,23 +286,18 @@ fig_all = px.scatter(df3, x="dim", y="sales", color="category_parent",
                      "date":"Aasta",
                   })
 
-fig = px.scatter(df2, x="dimension", y="end_price", color="category_parent",
-                 animation_frame="date", animation_group="category_parent", hover_name="category_parent",
-                 size='date', size_max=15, range_x=[-2,36], range_y=[-200,15000],
-                 labels={
-                     "end_price": "Haamrihind (€)",
-                     "dimension": "Pindala (m²)",
-                     "category_parent": "Tehnika",
-                     "date":"Aasta",
-                  })
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-frames= []
-fig = go.Figure(data=fig_all.data, frames=fig['frames'], layout=fig.layout)
-#fig.layout.updatemenus[0].buttons[0].args[1]["transition"]["duration"] = 0
-#fig.layout.updatemenus = [fig.layout.updatemenus[0]] + list(fig.layout.updatemenus)
-#fig.data = fig.frames[0].data
-
-st.plotly_chart(fig, use_container_width=True)
+frames = bin_scatter_frames(df2, "dimension", "end_price", "category_parent")
+lazy_animation("haus_ee_size", frames, token, dict(
+    x="dimension", y="end_price", color="category_parent",
+    hover_name="category_parent",
+    size='date', size_max=15, range_x=[-2,36], range_y=[-200,15000],
+    labels={
+        "end_price": "Haamrihind (€)",
+        "dimension": "Pindala (m²)",
+        "category_parent": "Tehnika",
+        "date":"Aasta",
+     }),
+    overview=fig_all, overview_label="Kõik aastad", year_label="Aasta", play_label="Mängi")
 create_paragraph('''
 See joonis näitab kunstiteoste keskmist hinda ja suurust tehnikate kaupa. Animatsiooni käivitades näeb võrdlust aastate kaupa.
 ''')
@@ -411,7 +308,7 @@ create_credits('''Allikad: Haus kunsti oksjonid (1997-2022)''')
 create_credits('''Muu: Inspireeritud Riivo Antoni loodud kunstiindeksist; <br>Heldet toetust pakkus <a href="https://tezos.foundation/">Tezos Foundation</a>''')
 toc.generate()
 
-@st.cache
+@st.cache_data
 def convert_df():
     # IMPORTANT: Cache the conversion to prevent computation on every rerun
     return read_df('data/haus_cleaned.csv').to_csv().encode('utf-8')
@@ -0,0 +1,26 @@
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import CacheHelper
+from CacheHelper import disk_cache
+
+@disk_cache
+def inner(value:int):
+    return value * 2
+
+@disk_cache
+def outer(value:int):
+    return inner(value) + 1
+
+def test_nested_entries_do_not_wait_for_themselves(tmp_path, monkeypatch):
+    monkeypatch.setattr(CacheHelper, "DISK_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(CacheHelper, "evict", lambda: None)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(outer(20)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert results == [41]
+    # both entries were cold, each took the lock of its own key
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".lock")]) == 2
@@ -0,0 +1,21 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ChartHelper import bin_scatter_frames
+
+def test_more_colors_than_points_per_frame_stay_within_budget():
+    rng = np.random.default_rng(0)
+    n_rows = 60000
+    df = pd.DataFrame({
+        "date": rng.integers(1996, 2022, n_rows),
+        "category": rng.integers(0, 300, n_rows).astype(str),
+        "x": rng.random(n_rows),
+        "y": rng.random(n_rows),
+    })
+    frames = bin_scatter_frames(df, "x", "y", "category", max_points=5000)
+    assert len(frames) <= 5000
+    assert frames["count"].sum() == n_rows
+    assert "Other" in set(frames["category"])
@@ -0,0 +1,29 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from IndexHelper import index_state, append_to_index
+
+def rows(author, dates, prices):
+    return pd.DataFrame({"author": author, "date": dates, "end_price": prices})
+
+CASES = {
+    "growth": (rows(["a", "a", "b"], [2001, 2002, 2001], [10.0, 20.0, 5.0]),
+               rows(["a", "b", "c"], [2003, 2004, 2003], [30.0, 10.0, 7.0])),
+    # nothing of the batch is kept: a zero price and a chain that started at zero
+    "zero price": (rows(["a", "a"], [2001, 2002], [10.0, 20.0]), rows(["a"], [2003], [0.0])),
+    "zero start": (rows(["a", "a"], [2001, 2002], [0.0, 20.0]), rows(["a"], [2003], [30.0])),
+    # an earlier change is NaN, the appended chain has to stay NaN
+    "nan change": (rows(["a", "a", "a"], [2001, 2002, 2003], [10.0, np.nan, 20.0]), rows(["a"], [2004], [40.0])),
+}
+
+@pytest.mark.parametrize("calculate_volume", [False, True])
+@pytest.mark.parametrize("case", list(CASES))
+def test_append_matches_full_recompute(case, calculate_volume):
+    old, new = CASES[case]
+    appended = append_to_index(index_state(old, "author", calculate_volume), new, "author", calculate_volume)
+    full = index_state(pd.concat([old, new], ignore_index=True), "author", calculate_volume)
+    pd.testing.assert_frame_equal(appended.sort_index(), full.sort_index(), check_dtype=False)
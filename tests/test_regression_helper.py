@@ -0,0 +1,20 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from RegressionHelper import hedonic_index
+
+def test_year_without_positive_prices_is_nan():
+    df = pd.DataFrame({
+        "author": ["a", "b", "a", "b", "a", "b"],
+        "technique": ["Oil"] * 6,
+        "category": ["Painting"] * 6,
+        "date": [2001, 2001, 2002, 2002, 2003, 2003],
+        "end_price": [10.0, 20.0, np.nan, 0.0, 30.0, 60.0],
+    })
+    result = hedonic_index(df).set_index("date")
+    assert np.isnan(result.loc[2002, "index"])
+    assert result.loc[2001, "index"] == 100
+    assert np.isclose(result.loc[2003, "index"], 300)
@@ -1,10 +1,11 @@
 import streamlit as st
 import plotly.express as px
-from prophet import Prophet
-from prophet.plot import plot_plotly, plot_components_plotly
 import plotly.graph_objects as go
 import pandas as pd
-from StreamlitHelper import Toc, get_img_with_href, read_df, create_table
+from StreamlitHelper import Toc, get_img_with_href, read_df, create_table, get_cube, get_author_index, get_index_forecast, FORECAST_BACKENDS, get_page_df, page_version, fragment, lazy_animation, get_partitions, cached_figure
+from IndexHelper import attach_author_metrics, cube_totals
+from ChartHelper import bin_scatter_frames, collapse_levels, treemap_nodes, treemap_figure
+from NormalizeHelper import AUCTION_TREEMAP_LEVELS, AUCTION_TREEMAP_RULES
 import numpy as np
 
 st.set_page_config(
@@ -37,21 +38,9 @@ st.markdown(inject_style_css, unsafe_allow_html=True)
 def create_paragraph(text):
     st.markdown('<span style="word-wrap:break-word;">' + text + '</span>', unsafe_allow_html=True)
     
-df = read_df('data/auctions_clean.csv')
-# Fix data
-df = df[df["date"] >= 2001]
-df = df[df["date"] <= 2021]
-df["date"] = df["date"].astype("int")
-df = df.sort_values(by=["date"])
-df.loc[df["technique"]=="Mixed tech", "technique"] = "Mixed technique"
-df_hist = read_df('data/historical_avg_price.csv')
-df_hist = df_hist[df_hist["date"] >= 2001]
-df_hist = df_hist.groupby("date").sum()
-
-#temp fix
-df.loc[df["technique"] == "Silk print", "category"] = "Graphics"
-df.loc[df["technique"] == "Vitrography", "category"] = "Graphics"
-df.loc[df["technique"] == "Wood cut", "category"] = "Graphics"
+df, token = get_page_df("auctions", page_version("auctions"))
+df_hist, _ = get_page_df("history", page_version("history"))
+cube = get_cube(df, token)
 
 # Sidebar Table of Contents
 toc = Toc()
@@ -92,25 +81,23 @@ create_paragraph('''The Art Index gives an overview of the rise and fall in the
 
 # TABLE - categories average price
 toc.subheader('Table - Historical Price Performance by Technique')
-table_data = create_table(df, "category", df["category"].unique(), calculate_volume=False, table_height=150)
+table_data = create_table(cube, "category", df["category"].unique(), calculate_volume=False, table_height=150, token=token)
 st.table(table_data)
 create_paragraph('''Ranked by medium, or technique, according to which medium dominates the highest-selling works.''')
 
 # Art Index Performance Prediction
 toc.subheader('Art Index Performance Prediction')
-df_art = pd.read_csv('./data/historical_avg_price.csv')
-df_art[['ds', 'y']] = df_art[['date', 'avg_price']]
-df_art = df_art[['ds', 'y']]
-m = Prophet()
-m.fit(df_art)
-future = m.make_future_dataframe(periods = 20428)
-forecast = m.predict(future.tail(1770))
-m.plot(forecast)
-fig1 = plot_plotly(m, forecast) 
-st.plotly_chart(fig1) 
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name='Forecast'))
-st.plotly_chart(fig, use_container_width=True)
+# reruns on its own when the model changes, not the whole page
+@fragment
+def index_forecast():
+    forecast_backend = st.selectbox('Forecast model', options=FORECAST_BACKENDS, key="forecast")
+    forecast, fig1 = get_index_forecast('data/historical_avg_price.csv', forecast_backend)
+    st.plotly_chart(fig1) 
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name='Forecast'))
+    st.plotly_chart(fig, use_container_width=True)
+
+index_forecast()
 
 create_paragraph('''According to this analysis, it is predicted that the art index price will experience a significant rise, increasing from 4,671.681 in February 2021 to 5,469.599 by December 2025.''')
 # FIGURE - date and volume
@@ -128,68 +115,69 @@ For example, in 2001 the auction turnover was around 174,000 euros, then in 2021
 
 # TABLE - categories volume
 toc.subheader('Table - Historical Volume Growth by Technique')
-table_data = create_table(df, "category", df["category"].unique(), calculate_volume=True, table_height=150)
+table_data = create_table(cube, "category", df["category"].unique(), calculate_volume=True, table_height=150, token=token)
 st.table(table_data)
 create_paragraph('''From this table, we can see which medium has had the highest turnover. Based on the given data, we can see, for example, that graphics are the most popular and with the highest annual turnover increase percentage (204% annually over 20 years and 35% for oil painting at the same time).''')
 
 # FIGURE - treemap covering categories, techniques and authors by volume and overbid
 toc.subheader('Figure - Art Sales by Technique and Artist (Start and End Price Difference)')
 
-df['start_price'] = df['start_price'].fillna(df['end_price'])
-df['overbid_%'] = (df['end_price'] - df['start_price'])/df['start_price'] * 100
-df['art_work_age'] = df['date'] - df['year']
-df2 = df.groupby(['author', 'technique', 'category']).agg({'end_price':['sum'], 'overbid_%':['mean']})
-df2.columns = ['total_sales', 'overbid_%']
-df2 = df2.reset_index()
-
-df2.loc[df2["category"] == "Mixed medium", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Mixed medium", "author"] = None
-df2.loc[df2["category"] == "Drawing", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Drawing", "author"] = None
-
-artists = df2["author"].unique()
-artists = [artist for artist in artists if artist is not None]
-artists = np.concatenate([["All artists"], artists])
-selected_artist =st.selectbox('Select an Artist', options=artists, key="1")
-if selected_artist=='All artists':
-
-    fig = px.treemap(df2, path=[px.Constant("Techniques"), 'category', 'technique', 'author'], values='total_sales',
-                      color='overbid_%',
-                      color_continuous_scale='RdBu',
-                      range_color = (0, df['overbid_%'].mean() + df['overbid_%'].std() / 2),
-                      labels={
-                         "overbid_%": "Overbid (%)",
-                         "total_sales": "Total Sales",
-                         "author": "Author",
-                      })
-else:    
-    artist_df = df2[df2["author"] == selected_artist]
-    fig = px.treemap(artist_df, path=["author", "category", "technique"], values="total_sales",
-                    color="overbid_%", color_continuous_scale="RdBu",
-                    range_color=(-20, 100), labels={
-                        "yearly_performance": "Historical Performance (%)",
-                        "total_sales": "Total Sales",
-                        "author": "Author",
-                    })
+df2 = cube_totals(cube, ['author', 'technique', 'category'])
+df2 = collapse_levels(df2, AUCTION_TREEMAP_LEVELS, AUCTION_TREEMAP_RULES)
+
+artist_rows, artist_slices = get_partitions(df2, token, "treemap_overbid")
+artists = np.concatenate([["All artists"], list(artist_slices)])
+
+def treemap_overbid(df2, artist_rows, artist_slices, selected_artist, overbid_range):
+    if selected_artist=='All artists':
+
+        nodes = treemap_nodes(df2, AUCTION_TREEMAP_LEVELS, "total_sales", "overbid_%", "Techniques")
+        fig = treemap_figure(nodes, "total_sales", "overbid_%",
+                          color_continuous_scale='RdBu',
+                          range_color = overbid_range,
+                          labels={
+                             "overbid_%": "Overbid (%)",
+                             "total_sales": "Total Sales",
+                             "author": "Author",
+                          })
+    else:    
+        artist_df = artist_rows.iloc[artist_slices[selected_artist]]
+        nodes = treemap_nodes(artist_df, ["author", "category", "technique"], "total_sales", "overbid_%")
+        fig = treemap_figure(nodes, "total_sales", "overbid_%", color_continuous_scale="RdBu",
+                        range_color=(-20, 100), labels={
+                            "yearly_performance": "Historical Performance (%)",
+                            "total_sales": "Total Sales",
+                            "author": "Author",
+                        })
 
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total Sales: %{value}<br> Overbid (%): %{color:.2f}',)
-st.plotly_chart(fig, use_container_width=True)
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total Sales: %{value}<br> Overbid (%): %{color:.2f}',)
+    return fig
+
+# reruns on its own when the artist changes, not the whole page
+@fragment
+def artist_treemap_overbid(df2, artist_rows, artist_slices, artists, overbid_range):
+    selected_artist =st.selectbox('Select an Artist', options=artists, key="1")
+    # built once per artist and dataset for every session
+    fig = cached_figure("auctions_en_treemap_overbid", token, selected_artist, treemap_overbid, df2, artist_rows, artist_slices, selected_artist, overbid_range)
+    st.plotly_chart(fig, use_container_width=True)
+
+    if selected_artist!='All artists':
+        artist_df = artist_rows.iloc[artist_slices[selected_artist]]
+        columns = ["author", "category", "technique", "total_sales", "overbid_%"]
+        data = artist_df[columns]
 
-if selected_artist!='All artists':
-    artist_df = df2[df2["author"] == selected_artist]
-    columns = ["author", "category", "technique", "total_sales", "overbid_%"]
-    data = artist_df[columns]
+        data = data.rename(columns={
+            "author":"Artist",
+            "category":"Category",
+            "technique":"Technique",
+            "total_sales": "Total Sales",
+            "overbid_%": "Overbid %",
+        })
+        data = data.reset_index(drop=True)
+        st.write(data)
 
-    data = data.rename(columns={
-        "author":"Artist",
-        "category":"Category",
-        "technique":"Technique",
-        "total_sales": "Total Sales",
-        "overbid_%": "Overbid %",
-    })
-    data = data.reset_index(drop=True)
-    st.write(data)
+artist_treemap_overbid(df2, artist_rows, artist_slices, artists, (0, df['overbid_%'].mean() + df['overbid_%'].std() / 2))
 
 
 create_paragraph('''Techniques and artists, where the color scale gives us an overview, how much art has been overbid during auctions ,and volume ranked by Technique and artist.
@@ -199,67 +187,68 @@ For example, the blue color shows artists and mediums, which had the highest ove
 
 # FIGURE - treemap covering categories, techniques and authors by volume and overbid
 toc.subheader('Figure - Art Sales by Technique and Artist (Historical Price Performance)')
-table_data = create_table(df, "author", list(df["author"].unique()), calculate_volume=False, table_height=250)
-df["yearly_performance"] = [table_data[table_data["Author"] == x]["Yearly growth (%)"] for x in df["author"]]
-df2 = df.groupby(['author', 'technique', 'category']).agg({'end_price':['sum'], 'yearly_performance':['mean']})
-df2.columns = ['total_sales', 'yearly_performance']
-df2 = df2.reset_index()
-
-df2.loc[df2["category"] == "Mixed medium", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Mixed medium", "author"] = None
-
-df2.loc[df2["category"] == "Drawing", "technique"] = df2["author"]
-df2.loc[df2["category"] == "Drawing", "author"] = None
-
-artists = df2["author"].unique()
-artists = [artist for artist in artists if artist is not None]
-artists = np.concatenate([["All artists"], artists])
-
-selected_artist2 =st.selectbox('Select an artist', options=artists, key="2")
-if selected_artist2=='All artists':
-
-    fig = px.treemap(df2, path=[px.Constant("Techniques"), 'category', 'technique', 'author'], values='total_sales',
-                      color='yearly_performance',
-                      color_continuous_scale='RdBu',
-                      range_color = (-20, 100),
-                      labels={
-                         "yearly_performance": "Historical Performance (%)",
-                         "total_sales": "Total Sales",
-                         "author": "Author",
-                      })
-else:    
-    artist_df = df2[df2["author"] == selected_artist2]
-
-    fig = px.treemap(artist_df, path=[px.Constant("Techniques"), 'category', 'technique', 'author'], values='total_sales',
-                        color='yearly_performance',
-                        color_continuous_scale='RdBu',
-                        range_color = (-20, 100),
-                        labels={
-                            "yearly_performance": "Historical Performance (%)",
-                            "total_sales": "Total Sales",
-                            "author": "Author",
-                        })
-
-
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total sales: %{value}<br> Annual return (%): %{color:.2f}',)
-st.plotly_chart(fig, use_container_width=True)
-
-if selected_artist2!='All artists':
-
-    artist_df = df2[df2["author"] == selected_artist2]
-    columns = ["category", "technique", "author", "total_sales", "yearly_performance"]
-    data = artist_df[columns]
-
-    data = data.rename(columns={
-        "author":"Artist",
-        "category":"Category",
-        "technique":"Technique",
-        "total_sales": "Total Sales",
-        "yearly_performance": "Historical Performance (%)",
-    })
-    data = data.reset_index(drop=True)
-    st.write(data)
+df2 = cube_totals(cube, ['author', 'technique', 'category']).drop("overbid_%", axis=1)
+df2 = attach_author_metrics(df2, get_author_index(cube, token))
+df2 = collapse_levels(df2, AUCTION_TREEMAP_LEVELS, AUCTION_TREEMAP_RULES)
+
+artist_rows, artist_slices = get_partitions(df2, token, "treemap_performance")
+artists = np.concatenate([["All artists"], list(artist_slices)])
+
+def treemap_performance(df2, artist_rows, artist_slices, selected_artist2):
+    if selected_artist2=='All artists':
+
+        nodes = treemap_nodes(df2, AUCTION_TREEMAP_LEVELS, "total_sales", "yearly_performance", "Techniques")
+        fig = treemap_figure(nodes, "total_sales", "yearly_performance",
+                          color_continuous_scale='RdBu',
+                          range_color = (-20, 100),
+                          labels={
+                             "yearly_performance": "Historical Performance (%)",
+                             "total_sales": "Total Sales",
+                             "author": "Author",
+                          })
+    else:    
+        artist_df = artist_rows.iloc[artist_slices[selected_artist2]]
+
+        nodes = treemap_nodes(artist_df, AUCTION_TREEMAP_LEVELS, "total_sales", "yearly_performance", "Techniques")
+        fig = treemap_figure(nodes, "total_sales", "yearly_performance",
+                            color_continuous_scale='RdBu',
+                            range_color = (-20, 100),
+                            labels={
+                                "yearly_performance": "Historical Performance (%)",
+                                "total_sales": "Total Sales",
+                                "author": "Author",
+                            })
+
+
+    fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
+    fig.update_traces(hovertemplate='<b>%{label} </b> <br> Total sales: %{value}<br> Annual return (%): %{color:.2f}',)
+    return fig
+
+# reruns on its own when the artist changes, not the whole page
+@fragment
+def artist_treemap_performance(df2, artist_rows, artist_slices, artists):
+    selected_artist2 =st.selectbox('Select an artist', options=artists, key="2")
+    # built once per artist and dataset for every session
+    fig = cached_figure("auctions_en_treemap_performance", token, selected_artist2, treemap_performance, df2, artist_rows, artist_slices, selected_artist2)
+    st.plotly_chart(fig, use_container_width=True)
+
+    if selected_artist2!='All artists':
+
+        artist_df = artist_rows.iloc[artist_slices[selected_artist2]]
+        columns = ["category", "technique", "author", "total_sales", "yearly_performance"]
+        data = artist_df[columns]
+
+        data = data.rename(columns={
+            "author":"Artist",
+            "category":"Category",
+            "technique":"Technique",
+            "total_sales": "Total Sales",
+            "yearly_performance": "Historical Performance (%)",
+        })
+        data = data.reset_index(drop=True)
+        st.write(data)
+
+artist_treemap_performance(df2, artist_rows, artist_slices, artists)
 
 
 create_paragraph('''
@@ -269,11 +258,11 @@ For example, the blue color shows artists and mediums, which had the highest his
 ''')
 
 # TABLE - best authors average price
-author_sum = df.groupby(["author"], sort=False)["end_price"].sum()
+author_sum = cube.groupby(["author"], sort=False)["end_price_sum"].sum()
 top_authors = author_sum.sort_values(ascending=False)[:10]
 
 toc.subheader('Table - Top 10 Best Performing Artists (Price Performance)')
-table_data = create_table(df, "author", top_authors.index, calculate_volume=False, table_height=250)    
+table_data = create_table(cube, "author", top_authors.index, calculate_volume=False, table_height=250, token=token)    
 st.table(table_data)
 create_paragraph('''This table shows the most popular artists and their historical price growth percentage. The percentage is calculated based on annual average end price differences.
 
@@ -282,29 +271,29 @@ Leading this table is Konrad Mägi, whose growth percentage is on average 198.95
 
 # TABLE - best authors volume
 toc.subheader('Table - Top 10 Best Performing Artists (Volume Growth)')
-table_data = create_table(df, "author", top_authors.index, calculate_volume=True, table_height=250)    
+table_data = create_table(cube, "author", top_authors.index, calculate_volume=True, table_height=250, token=token)    
 st.table(table_data)
 create_paragraph('''This table shows the turnover and average annual growth of artworks. Here Wiiralt is positioned at 8th place and Konrad Mägi at 1st. Because the growth percentage is during the whole period (2001-2021) turnover, then the artists, who have the most works bought, are situated at the top of the table.
 ''')
 
 # FIGURE - date and price
 toc.subheader('Figure - Age of Art Work vs Price')
-df['art_work_age'] = df['date'] - df['year']
 q_low = df["end_price"].quantile(0.1)
 q_hi  = df["end_price"].quantile(0.9)
 df = df[(df["end_price"] < q_hi) & (df["end_price"] > q_low)]
-fig = px.scatter(df.dropna(subset=["decade"]), x="art_work_age", y="end_price", color="category",
-                 animation_frame="date", animation_group="technique", hover_name="technique",
-                 size='date', hover_data=['author'], size_max=15, range_x=[-4,130], range_y=[-1000,8200],
-                 labels={
-                     "end_price": "Auction Final Sales Price (€)",
-                     "art_work_age": "Art Work Age",
-                     "author": "Author",
-                     "category": "Technique",
-                     "decade": "Decade"
-                  })
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-st.plotly_chart(fig, use_container_width=True)
+frames = bin_scatter_frames(df.dropna(subset=["decade"]), "art_work_age", "end_price", "category", keep=["technique", "author"])
+lazy_animation("auctions_en_age", frames, token, dict(
+    x="art_work_age", y="end_price", color="category",
+    hover_name="technique",
+    size='date', hover_data=['author'], size_max=15, range_x=[-4,130], range_y=[-1000,8200],
+    labels={
+        "end_price": "Auction Final Sales Price (€)",
+        "art_work_age": "Art Work Age",
+        "author": "Author",
+        "category": "Technique",
+        "decade": "Decade"
+     }),
+    year_label="Year", play_label="Play")
 create_paragraph('''From the given graph, it is possible to determine the price of the work according to the age and technique of the work of art. Techniques are separated by color.
 
 The oldest work dates back to 1900 but is not the most expensive. In general, it can be seen that older works are more expensive, with the exception of Olev Subbi. It can be seen that pre-World War II works from 1910-1940 have been sold higher.''')
@@ -315,17 +304,18 @@ df["dimension"] = df["dimension"] / (100*100)
 q_low = df["dimension"].quantile(0.1)
 q_hi  = df["dimension"].quantile(0.9)
 df = df[(df["dimension"] < q_hi) & (df["dimension"] > q_low)]
-fig = px.scatter(df.dropna(subset=["dimension"]), x="dimension", y="end_price", color="category",
-                 animation_frame="date", animation_group="technique", hover_name="technique",
-                 size='date', hover_data=['author'], size_max=15, range_x=[-0.03, 4], range_y=[-1000,8200],
-                 labels={
-                     "end_price": "Auction Final Sales Price (€)",
-                     "dimension": "Dimension (m²)",
-                     "author": "Author",
-                     "category": "Technique",
-                  })
-fig.update_layout(margin=dict(l=5, r=5, t=5, b=5))
-st.plotly_chart(fig, use_container_width=True)
+frames = bin_scatter_frames(df, "dimension", "end_price", "category", keep=["technique", "author"])
+lazy_animation("auctions_en_size", frames, token, dict(
+    x="dimension", y="end_price", color="category",
+    hover_name="technique",
+    size='date', hover_data=['author'], size_max=15, range_x=[-0.03, 4], range_y=[-1000,8200],
+    labels={
+        "end_price": "Auction Final Sales Price (€)",
+        "dimension": "Dimension (m²)",
+        "author": "Author",
+        "category": "Technique",
+     }),
+    year_label="Year", play_label="Play")
 create_paragraph('''An overview of the relationship between the dimensions, technique, and price of the work. Many smaller format works are often more expensive than large ones. The size of the piece does not necessarily mean that it is more expensive. Rather, the author is more important, and than the size of the work. For example, Konrad Mägi's Õlimaa is among the averages on the measurement chart, but considerably higher than the others on the price scale (127,823 euros hammer price), while the hammer price of the largest work (Toomas Vint) is €7,094.''')
 
 def create_credits(text):
@@ -337,7 +327,7 @@ create_credits('''Other credits: Inspired by the original Estonian Art Index cre
 
 toc.generate()
 
-@st.cache()
+@st.cache_data
 def convert_df():
     # IMPORTANT: Cache the conversion to prevent computation on every rerun
     return read_df('data/auctions_clean.csv').to_csv().encode('utf-8')